@@ -1,11 +1,21 @@
 from langchain_core.messages import HumanMessage, ToolMessage, AIMessage, SystemMessage
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import run_in_executor
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import json
 import os
+import time
 import logging
+from typing import Annotated, List, Optional
 from typing_extensions import Literal
 from agent.utils.prompt import system_prompt
+from agent.utils.retrieval import document_key
 from agent.utils.tools import rag_tool, medical_web_search, disease_prediction
 
 load_dotenv()
@@ -41,29 +51,123 @@ tools = [
 tools_by_name = {tool.name: tool for tool in tools}
 llm_with_tools = llm.bind_tools(tools)
 
+# Fingerprint of what shapes an answer besides the knowledge base (prompt, model, tools);
+# cached answers are dropped when it changes
+AGENT_PROMPT_VERSION = hashlib.sha256(json.dumps({
+    "system_prompt": system_prompt,
+    "model": llm.model_name,
+    "temperature": llm.temperature,
+    "tools": {tool.name: tool.description for tool in tools},
+}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+# Tool execution settings
+# Per-tool timeouts in seconds; TOOL_TIMEOUT_SECONDS applies to any tool not listed
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+TOOL_TIMEOUTS = {
+    "rag_tool": float(os.getenv("RAG_TOOL_TIMEOUT_SECONDS", "20")),
+    "medical_web_search": float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "15")),
+}
+# Sync-only tools run here so parallel tool calls don't compete with the agent's default executor.
+# Sized for every admitted agent run (AGENT_MAX_CONCURRENCY in main.py) to have two tools in flight.
+TOOL_THREAD_POOL_SIZE = int(os.getenv("TOOL_THREAD_POOL_SIZE", str(2 * int(os.getenv("AGENT_MAX_CONCURRENCY", "32")))))
+tool_executor = ThreadPoolExecutor(
+    max_workers=TOOL_THREAD_POOL_SIZE,
+    thread_name_prefix="mediblaze-tool"
+)
+
+# Tools that receive the turn's retrieval scratchpad as an injected `retrieved_docs` argument
+SCRATCHPAD_TOOLS = {"disease_prediction"}
+
+# Agent State
+def merge_retrieved_docs(existing: List[Document], new: List[Document]) -> List[Document]:
+    """Reducer for the retrieval scratchpad: append documents not fetched before in this turn."""
+    merged = list(existing or [])
+    seen = {document_key(doc) for doc in merged}
+    for doc in new or []:
+        key = document_key(doc)
+        if key not in seen:
+            seen.add(key)
+            merged.append(doc)
+    return merged
+
+class AgentState(MessagesState):
+    """Conversation messages plus the knowledge base documents retrieved so far."""
+    retrieved_docs: Annotated[List[Document], merge_retrieved_docs]
+
 # Agent Nodes
-def llm_call(state: MessagesState):
+async def llm_call(state: MessagesState, config: RunnableConfig):
     """LLM processes the medical query and decides on tool usage."""
     return {
         "messages": [
-            llm_with_tools.invoke(
+            await llm_with_tools.ainvoke(
                 [SystemMessage(content=system_prompt)]
-                + state["messages"]
+                + state["messages"],
+                config
             )
         ]
     }
 
-def tool_node(state: dict):
-    """Executes medical tools with comprehensive error handling."""
-    result = []
-    for tool_call in state["messages"][-1].tool_calls:
-        try:
-            tool = tools_by_name[tool_call["name"]]
-            observation = tool.invoke(tool_call["args"])
-            result.append(ToolMessage(content=str(observation), tool_call_id=tool_call["id"]))
-        except Exception as e:
-            result.append(ToolMessage(content=f"⚠️ Tool error occurred. Providing response based on available knowledge.", tool_call_id=tool_call["id"]))
-    return {"messages": result}
+async def run_in_tool_thread(timeout: float, func, *args):
+    """
+    Runs a blocking call on tool_executor with `timeout` counted from when a thread picks it up,
+    so time queued behind other tool calls is not charged to it (the queue wait has its own
+    `timeout`). On timeout the thread keeps running in the background; its result is discarded.
+    """
+    loop = asyncio.get_running_loop()
+    thread_started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(thread_started.set)
+        return func(*args)
+
+    pending = asyncio.ensure_future(run_in_executor(tool_executor, run))
+    try:
+        await asyncio.wait_for(thread_started.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pending.cancel()  # Still queued, so it never starts
+        raise
+    return await asyncio.wait_for(pending, timeout=timeout)
+
+async def run_tool_call(tool_call: dict, config: RunnableConfig, scratchpad: Optional[List[Document]] = None) -> ToolMessage:
+    """Runs a single tool call under its timeout and records its timing on the ToolMessage."""
+    tool_name = tool_call["name"]
+    timeout = TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT_SECONDS)
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        tool = tools_by_name[tool_name]
+        call = {**tool_call, "type": "tool_call"}
+        if tool_name in SCRATCHPAD_TOOLS:
+            call["args"] = {**tool_call["args"], "retrieved_docs": list(scratchpad or [])}
+        if getattr(tool, "coroutine", None) is not None:
+            message = await asyncio.wait_for(tool.ainvoke(call, config), timeout=timeout)
+        else:
+            message = await run_in_tool_thread(timeout, tool.invoke, call, config)
+    except asyncio.TimeoutError:
+        timed_out = True
+        logger.warning(f"⏱️ [MediBlaze] Tool {tool_name} timed out after {timeout}s")
+        message = ToolMessage(content="⚠️ Tool timed out. Providing response based on available knowledge.", tool_call_id=tool_call["id"], status="error")
+    except Exception as e:
+        logger.error(f"❌ [MediBlaze] Tool {tool_name} failed: {str(e)}")
+        message = ToolMessage(content="⚠️ Tool error occurred. Providing response based on available knowledge.", tool_call_id=tool_call["id"], status="error")
+    
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    message.response_metadata.update({
+        "tool_name": tool_name,
+        "duration_ms": duration_ms,
+        "timed_out": timed_out,
+    })
+    logger.info(f"🔧 [MediBlaze] Tool {tool_name} finished in {duration_ms}ms")
+    return message
+
+async def tool_node(state: dict, config: RunnableConfig):
+    """Executes all tool calls of the last LLM turn concurrently, preserving call order."""
+    tool_calls = state["messages"][-1].tool_calls
+    scratchpad = state.get("retrieved_docs", [])
+    result = await asyncio.gather(*(run_tool_call(tool_call, config, scratchpad) for tool_call in tool_calls))
+    # Retrieval tools return their documents as the ToolMessage artifact
+    fetched = [doc for message in result if isinstance(message.artifact, list) for doc in message.artifact]
+    return {"messages": list(result), "retrieved_docs": fetched}
 
 def should_continue(state: MessagesState) -> Literal["Action", "END"]:
     """
@@ -78,7 +182,7 @@ def should_continue(state: MessagesState) -> Literal["Action", "END"]:
 
 
 # Build MediBlaze Agent Workflow
-agent_builder = StateGraph(MessagesState)
+agent_builder = StateGraph(AgentState)
 agent_builder.add_node("llm_call", llm_call)
 agent_builder.add_node("environment", tool_node)
 agent_builder.add_edge(START, "llm_call")
@@ -92,5 +196,5 @@ agent_builder.add_conditional_edges(
 )
 agent_builder.add_edge("environment", "llm_call")
 
-# Compile the MediBlaze Agent
+# Compile the MediBlaze Agent (async graph: drive it with ainvoke/astream)
 agent = agent_builder.compile()
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+💬 Semantic answer cache for history-free chat turns.
+A first-turn question is embedded and compared with earlier first-turn questions; a stored answer
+is served without running the agent (no rag_tool, no web search, no LLM calls) only when the
+similarity is above the threshold and both questions have the same content terms - wording,
+word order and inflection may differ, but never the condition, population, drug or number.
+Entries expire after a TTL and are all dropped when the published index version or the agent
+prompt/model fingerprint changes.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agent.utils.cache import normalize_query
+from agent.utils.compression import stem
+from agent.utils.sparse_index import tokenize
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "true").lower() in ("1", "true", "yes")
+# Cosine similarity at which two questions with the same content terms count as the same question
+# (e5 scores sit in a narrow, high band, so the threshold is high and terms must match as well)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "21600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+# Answers built from a personal symptom analysis are never reused for someone else
+UNCACHEABLE_TOOLS = {"disease_prediction"}
+
+logger = logging.getLogger(__name__)
+
+
+def content_terms(question: str) -> frozenset:
+    """Stemmed non-stopword terms (numbers included) a cached question must share exactly."""
+    return frozenset(stem(token) for token in tokenize(question))
+
+
+class SemanticAnswerCache:
+    """Thread-safe LRU of (question embedding, answer) pairs, searched with one matrix product."""
+
+    def __init__(self, embeddings: Callable[[], Embeddings], version: Callable[[], Hashable],
+                 threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 maxsize: int = ANSWER_CACHE_SIZE):
+        self._embeddings = embeddings
+        self._version = version
+        self.threshold = threshold
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        # Question vectors stacked for search, with the entry key of each row; rebuilt lazily after
+        # inserts and evictions (LRU reordering leaves it valid since rows are looked up by key)
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._current_version: Optional[Hashable] = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self._embeddings().embed_query(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _check_version(self, version: Hashable) -> None:
+        """Drop everything when the index version or the agent fingerprint changed (call with the lock held)."""
+        if version != self._current_version:
+            if self._entries:
+                logger.info(f"🔄 [MediBlaze] Answer cache invalidated ({len(self._entries)} entries): version changed")
+                self.invalidations += 1
+            self._entries.clear()
+            self._matrix = None
+            self._current_version = version
+
+    def _expire(self) -> None:
+        if self.ttl is None:
+            return
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry["expires_at"] < now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def get(self, question: str) -> Optional[Dict]:
+        """The cached answer entry for this question or a near-duplicate of it, else None."""
+        key = normalize_query(question)
+        # Resolving the version may hit the network (Pinecone alias), so it happens outside the lock
+        version = self._version()
+        with self._lock:
+            self._check_version(version)
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry
+            if not self._entries:
+                self.misses += 1
+                return None
+        vector = self._embed(question)
+        terms = content_terms(question)
+        with self._lock:
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key]["vector"] for key in self._matrix_keys])
+            similarities = self._matrix @ vector
+            for row in np.argsort(-similarities):
+                if similarities[row] < self.threshold:
+                    break
+                key = self._matrix_keys[row]
+                entry = self._entries[key]
+                # "dose for children" / "dose for adults" or "fever for 3 days" / "10 days" embed alike
+                # but need different answers
+                if entry["terms"] == terms:
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    logger.info(f"💬 [MediBlaze] Answer cache hit ({similarities[row]:.3f}): {entry['question'][:80]}")
+                    return entry
+            self.misses += 1
+            return None
+
+    def set(self, question: str, answer: str, tools_used: List[str]) -> bool:
+        """Store the answer to a history-free turn; returns False when it must not be reused."""
+        if not answer or UNCACHEABLE_TOOLS.intersection(tools_used):
+            return False
+        vector = self._embed(question)
+        key = normalize_query(question)
+        version = self._version()
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = {
+                "question": question,
+                "answer": answer,
+                "tools_used": list(tools_used),
+                "vector": vector,
+                "terms": content_terms(question),
+                "expires_at": time.monotonic() + self.ttl if self.ttl else float("inf"),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,107 @@
+"""
+🗜️ Extractive compression of knowledge base chunks before they enter the prompt.
+Each chunk is split into sentences, sentences are scored locally by the (stemmed) query terms
+they contain (rarer terms count more), and every chunk keeps its best sentences - in their
+original order - until the tool result's token budget is spent.
+"""
+import os
+import re
+import logging
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agent.utils.sparse_index import tokenize
+from agent.utils.tokens import count_tokens
+
+# Keep only query-relevant sentences of retrieved chunks
+COMPRESSION_ENABLED = os.getenv("RAG_COMPRESSION", "true").lower() in ("1", "true", "yes")
+# Token budget for the knowledge base text of one tool result
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "600"))
+# Marks sentences left out between two kept ones
+GAP_MARKER = " … "
+
+# Stripped by stem(), longest first
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ies", "es", "ed", "s")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'•-])|\n\s*\n|\s*•\s*")
+
+logger = logging.getLogger(__name__)
+
+
+def stem(token: str) -> str:
+    """Crude suffix stripping so plurals and simple inflections match ("migraines" / "migraine", "causes" / "caused")."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)] + ("y" if suffix == "ies" else "")
+            break
+    return token[:-1] if token.endswith("e") and len(token) > 4 else token
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = (" ".join(part.split()) for part in _SENTENCE_END.split(text))
+    return [sentence for sentence in sentences if sentence]
+
+
+def compress_documents(query: str, docs: Sequence[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[str]:
+    """
+    Extract of each document, in rank order, within `token_budget` tokens overall. Every document
+    first gets its best-matching sentence (its leading one when nothing matches), then the other
+    matching sentences are added best first, and leftover budget goes to the leading sentences of
+    the top-ranked documents.
+    """
+    sentences = [split_sentences(doc.page_content) for doc in docs]
+    # Ordered by document rank, then position - the order leftover budget is spent in
+    flat = [(doc_rank, position, sentence)
+            for doc_rank, doc_sentences in enumerate(sentences)
+            for position, sentence in enumerate(doc_sentences)]
+    terms = sorted({stem(token) for token in tokenize(query)})
+    if terms and flat:
+        present = np.array([[term in tokens for term in terms]
+                            for tokens in ({stem(token) for token in tokenize(sentence)} for _, _, sentence in flat)],
+                           dtype=bool)
+        weights = np.log1p(len(flat) / np.maximum(present.sum(axis=0), 1))
+        scores = present @ weights
+    else:
+        scores = np.zeros(len(flat))
+    costs = [count_tokens(sentence) for _, _, sentence in flat]
+
+    kept, used = set(), 0
+
+    def take(i: int) -> None:
+        nonlocal used
+        if i not in kept and used + costs[i] <= token_budget:
+            kept.add(i)
+            used += costs[i]
+
+    for doc_rank in range(len(docs)):
+        candidates = [i for i in range(len(flat)) if flat[i][0] == doc_rank]
+        if candidates:
+            take(max(candidates, key=lambda i: (scores[i], -flat[i][1])))
+    # Ties go to the higher-ranked document, then earlier sentences
+    for i in sorted((i for i in range(len(flat)) if scores[i] > 0), key=lambda i: (-scores[i], flat[i][0], flat[i][1])):
+        take(i)
+    for i in range(len(flat)):
+        take(i)
+
+    extracts = []
+    for doc_rank, doc_sentences in enumerate(sentences):
+        positions = sorted(flat[i][1] for i in kept if flat[i][0] == doc_rank)
+        if not positions:
+            continue
+        text = doc_sentences[positions[0]]
+        for previous, position in zip(positions, positions[1:]):
+            text += (" " if position == previous + 1 else GAP_MARKER) + doc_sentences[position]
+        extracts.append(text)
+    return extracts
+
+
+def build_context(query: str, docs: Sequence[Document], token_budget: int = CONTEXT_TOKEN_BUDGET,
+                  enabled: bool = COMPRESSION_ENABLED) -> str:
+    """Knowledge base text for a tool result: compressed extracts, or the full chunks when disabled."""
+    if not enabled:
+        return "\n\n".join(doc.page_content for doc in docs)
+    context = "\n\n".join(compress_documents(query, docs, token_budget))
+    logger.info(f"🗜️ [MediBlaze] Compressed {len(docs)} knowledge base chunks "
+                f"from ~{sum(count_tokens(doc.page_content) for doc in docs)} to ~{count_tokens(context)} tokens")
+    return context
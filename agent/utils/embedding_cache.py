@@ -0,0 +1,219 @@
+"""
+🧠 Embedding cache for the MediBlaze knowledge base.
+Query embeddings are kept in an in-memory LRU + TTL tier and, optionally, in an on-disk tier
+(memory-mapped float32 matrix + SQLite key index) that survives restarts. src/rag_upload.py
+uses the same disk tier for chunk embeddings, so re-ingestion only embeds changed text.
+"""
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agent.utils.cache import TTLCache, normalize_query
+
+try:
+    import fcntl
+except ImportError:  # Windows: only writers within one process are serialised
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_key(model: str, text: str, kind: str = "query") -> str:
+    """
+    Cache key for an embedding: model + input type + text. Queries are normalised so
+    trivially different phrasings share an entry; passages are keyed by their exact text.
+    """
+    text = normalize_query(text) if kind == "query" else text
+    payload = f"{model}\x00{kind}\x00{text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Append-only on-disk embedding store.
+    Vectors live in `vectors.f32` (rows of float32, read through np.memmap) and
+    `index.sqlite` maps each key to its row number. Appends hold an exclusive lock on
+    `vectors.lock`, so several processes (API workers, ingestion) can share one directory.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._lock_path = os.path.join(directory, "vectors.lock")
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+        found = self._db.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+        self.dimension: Optional[int] = int(found[0]) if found else None
+        self._matrix: Optional[np.memmap] = None
+
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive across threads and, where fcntl exists, across processes."""
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _row_count(self) -> int:
+        if not self.dimension or not os.path.exists(self._vectors_path):
+            return 0
+        return os.path.getsize(self._vectors_path) // (self.dimension * 4)
+
+    def _rows(self, needed: int) -> Optional[np.memmap]:
+        """Memory-map the matrix, remapping when rows beyond the current mapping are requested."""
+        if self._matrix is None or self._matrix.shape[0] <= needed:
+            rows = self._row_count()
+            if rows == 0:
+                return None
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimension))
+        return self._matrix
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(keys)
+        if not keys or not self.dimension:
+            return {}
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):  # Stay below SQLite's bound-parameter limit
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, row FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                if not rows:
+                    continue
+                matrix = self._rows(max(row for _, row in rows))
+                if matrix is None:
+                    continue
+                for key, row in rows:
+                    if row < matrix.shape[0]:
+                        found[key] = matrix[row].tolist()
+        return found
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        vectors = np.asarray(list(items.values()), dtype=np.float32)
+        with self._write_lock():
+            if self.dimension is None:
+                # Another process may have created the store since this one opened it
+                found = self._db.execute("SELECT value FROM meta WHERE name = 'dimension'").fetchone()
+                self.dimension = int(found[0]) if found else int(vectors.shape[1])
+                self._db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('dimension', ?)", (str(self.dimension),))
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dimension}")
+            row_bytes = self.dimension * 4
+            # Vectors are written before the index rows, so a crash can only leave unreferenced rows behind
+            with open(self._vectors_path, "ab") as f:
+                # The row offset is taken from the file under the lock, never from an earlier read
+                size = os.fstat(f.fileno()).st_size
+                if size % row_bytes:
+                    f.truncate(size - size % row_bytes)  # Partial row left by an interrupted write
+                first_row = size // row_bytes
+                f.write(vectors.tobytes())
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, row) VALUES (?, ?)",
+                [(key, first_row + offset) for offset, key in enumerate(items)]
+            )
+            self._db.commit()
+
+    def put(self, key: str, vector: List[float]) -> None:
+        self.put_many({key: vector})
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from the memory and disk tiers."""
+
+    def __init__(self, base: Embeddings, model: str, memory_cache: Optional[TTLCache] = None,
+                 disk_store: Optional[DiskEmbeddingStore] = None):
+        self.base = base
+        self.model = model
+        # An empty TTLCache is falsy (__len__), so test for None rather than truthiness
+        self.memory_cache = memory_cache if memory_cache is not None else TTLCache()
+        self.disk_store = disk_store
+        self.disk_hits = 0
+        self.remote_calls = 0
+        self.remote_texts = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        for key in keys:
+            vector = self.memory_cache.get(key)
+            if vector is not None:
+                found[key] = vector
+        missing = [key for key in keys if key not in found]
+        if missing and self.disk_store is not None:
+            on_disk = self.disk_store.get_many(missing)
+            for key, vector in on_disk.items():
+                self.memory_cache.set(key, vector)
+            with self._lock:
+                self.disk_hits += len(on_disk)
+            found.update(on_disk)
+        return found
+
+    def _store(self, computed: Dict[str, List[float]]) -> None:
+        for key, vector in computed.items():
+            self.memory_cache.set(key, vector)
+        if self.disk_store is not None:
+            try:
+                self.disk_store.put_many(computed)
+            except Exception as e:
+                logger.warning(f"⚠️ [MediBlaze] Could not persist embeddings to disk cache: {str(e)}")
+
+    def embed_query(self, text: str) -> List[float]:
+        key = embedding_key(self.model, text, "query")
+        found = self._lookup([key])
+        if key in found:
+            return found[key]
+        with self._lock:
+            self.remote_calls += 1
+            self.remote_texts += 1
+        vector = self.base.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model, text, "passage") for text in texts]
+        found = self._lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            with self._lock:
+                self.remote_calls += 1
+                self.remote_texts += len(missing)
+            computed = dict(zip(missing, self.base.embed_documents(list(missing.values()))))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def stats(self) -> Dict:
+        return {
+            "model": self.model,
+            "memory": self.memory_cache.stats(),
+            "disk_enabled": self.disk_store is not None,
+            "disk_hits": self.disk_hits,
+            "remote_calls": self.remote_calls,
+            "remote_texts": self.remote_texts,
+        }
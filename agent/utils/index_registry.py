@@ -0,0 +1,172 @@
+"""
+🗂️ Index registry for the MediBlaze knowledge base.
+The ingestion script builds every update as a new index version (a Pinecone namespace or a
+local index directory) and then publishes it here - an atomic alias switch. The tools read
+the alias through a short-lived cache, so they move to the new version in one step; replaced
+versions are listed as retired until ingestion drops them after a grace period.
+For Pinecone the alias is also stored in the index itself (one record in PINECONE_ALIAS_NAMESPACE),
+so servers that do not share the registry file still find the live namespace.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Local state shared between ingestion and the API (mount it into the container in docker-compose)
+STATE_DIR = os.getenv("MEDIBLAZE_STATE_DIR", os.path.join(PROJECT_ROOT, ".mediblaze"))
+REGISTRY_PATH = os.getenv("INDEX_REGISTRY_PATH", os.path.join(STATE_DIR, "index_registry.json"))
+REGISTRY_REFRESH_SECONDS = float(os.getenv("INDEX_REGISTRY_REFRESH_SECONDS", "5"))
+
+UNVERSIONED = "unversioned"
+# Namespace holding one alias record per published Pinecone index; never searched or dropped
+PINECONE_ALIAS_NAMESPACE = "__mediblaze_aliases__"
+ALIAS_FIELDS = ("index_name", "namespace", "version", "published_at", "backend")
+
+
+def new_version_id() -> str:
+    """Sortable, unique version id: timestamp plus a random suffix, so runs started in the same second differ."""
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def read_registry(path: str = REGISTRY_PATH) -> Dict:
+    """Load the registry file; a missing or unreadable file is an empty registry."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"aliases": {}}
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ [MediBlaze] Could not read index registry {path}: {str(e)}")
+        return {"aliases": {}}
+
+
+def write_registry(registry: Dict, path: str = REGISTRY_PATH) -> None:
+    """Atomically replace the registry file so readers never see a partial write."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def publish_index_version(alias: str, index_name: Optional[str] = None, namespace: str = "",
+                          version: Optional[str] = None, path: str = REGISTRY_PATH,
+                          backend: Optional[str] = None) -> Dict:
+    """Record a new version of the index behind `alias`; returns the published entry."""
+    entry = {
+        "index_name": index_name or alias,
+        "namespace": namespace,
+        "version": version or new_version_id(),
+        "published_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    if backend:
+        entry["backend"] = backend
+    registry = read_registry(path)
+    previous = registry.setdefault("aliases", {}).get(alias)
+    registry["aliases"][alias] = entry
+    if previous and (previous.get("namespace", ""), previous.get("version")) != (namespace, entry["version"]):
+        # Servers may still be reading the replaced version until their registry cache refreshes
+        retired = {**previous, "retired_at": entry["published_at"]}
+        registry.setdefault("retired", {}).setdefault(alias, []).append(retired)
+    write_registry(registry, path)
+    logger.info(f"📌 [MediBlaze] Published {alias} version {entry['version']}")
+    return entry
+
+
+def retired_index_versions(alias: str, path: str = REGISTRY_PATH) -> List[Dict]:
+    """Versions that were replaced behind `alias` and not dropped yet, oldest first."""
+    return list(read_registry(path).get("retired", {}).get(alias, []))
+
+
+def forget_retired_version(alias: str, entry: Dict, path: str = REGISTRY_PATH) -> None:
+    """Remove a dropped version from the retired list."""
+    registry = read_registry(path)
+    retired = registry.get("retired", {}).get(alias, [])
+    key = (entry.get("namespace", ""), entry.get("version"))
+    registry.setdefault("retired", {})[alias] = [
+        item for item in retired if (item.get("namespace", ""), item.get("version")) != key
+    ]
+    write_registry(registry, path)
+
+
+def write_pinecone_alias(pinecone_index, alias: str, entry: Dict) -> None:
+    """Store the published entry for `alias` as a record of the Pinecone index it points to."""
+    dimension = pinecone_index.describe_index_stats().dimension
+    # Dense Pinecone vectors need a non-zero value; the record is only ever fetched by id
+    values = [1.0] + [0.0] * (dimension - 1)
+    metadata = {field: entry[field] for field in ALIAS_FIELDS if field in entry}
+    pinecone_index.upsert(vectors=[(alias, values, metadata)], namespace=PINECONE_ALIAS_NAMESPACE)
+
+
+def read_pinecone_alias(pinecone_index, alias: str) -> Optional[Dict]:
+    """The entry stored by write_pinecone_alias, or None when the index has none."""
+    record = pinecone_index.fetch(ids=[alias], namespace=PINECONE_ALIAS_NAMESPACE).vectors.get(alias)
+    if record is None or not record.metadata:
+        return None
+    return {field: record.metadata[field] for field in ALIAS_FIELDS if field in record.metadata}
+
+
+class IndexRegistry:
+    """
+    Cached reader for the published index versions. With `remote` (alias -> entry or None,
+    e.g. read_pinecone_alias) the shared copy wins over the local file, which remains the
+    fallback when the remote read fails.
+    """
+
+    def __init__(self, path: str = REGISTRY_PATH, refresh_seconds: float = REGISTRY_REFRESH_SECONDS,
+                 remote: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.remote = remote
+        self._lock = threading.Lock()
+        self._registry: Dict = {"aliases": {}}
+        self._mtime: Optional[float] = None
+        self._checked_at = float("-inf")
+        self._remote_entries: Dict[str, Optional[Dict]] = {}
+        self._remote_checked_at: Dict[str, float] = {}
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if now - self._checked_at < self.refresh_seconds:
+                return
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self._registry = read_registry(self.path) if mtime is not None else {"aliases": {}}
+                self._mtime = mtime
+            self._checked_at = now
+
+    def _remote_entry(self, alias: str) -> Optional[Dict]:
+        now = time.monotonic()
+        if now - self._remote_checked_at.get(alias, float("-inf")) >= self.refresh_seconds:
+            try:
+                self._remote_entries[alias] = self.remote(alias)
+            except Exception as e:
+                # Keep serving the last known entry; retry at the next refresh
+                logger.warning(f"⚠️ [MediBlaze] Could not read the published version of {alias}: {str(e)}")
+            self._remote_checked_at[alias] = now
+        return self._remote_entries.get(alias)
+
+    def resolve(self, alias: str) -> Dict:
+        """Current entry for `alias`, defaulting to the unversioned index of the same name."""
+        self._refresh()
+        entry = self._remote_entry(alias) if self.remote is not None else None
+        if entry is None:
+            entry = self._registry.get("aliases", {}).get(alias)
+        if entry is None:
+            return {"index_name": alias, "namespace": "", "version": UNVERSIONED}
+        return entry
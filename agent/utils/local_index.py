@@ -0,0 +1,263 @@
+"""
+💾 Local, in-process vector index for the MediBlaze knowledge base.
+The ingestion script writes normalised embeddings to a float32 matrix (memory-mapped at load time)
+next to a JSONL file of the chunks; an optional IVF layout (k-means lists) limits each search to
+the closest clusters. Also provides HashingEmbeddings, an offline stand-in for the embedding API.
+"""
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from agent.utils.metadata_filter import FILTER_CACHE_SIZE, filter_key, filter_mask
+from agent.utils.sparse_index import build_bm25
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+META_FILE = "meta.json"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on normalised vectors; returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(vectors.shape[0], size=nlist, replace=False)].copy()
+    assignments = np.zeros(vectors.shape[0], dtype=np.int64)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+        centroids = _normalize_rows(centroids)
+    return centroids.astype(np.float32), assignments
+
+
+class LocalIndexWriter:
+    """
+    Streams documents + embeddings into a new local index directory.
+    Files are written to a temporary sibling and moved into place by close(), so a running
+    server never loads a half-written index. `nlist > 0` also builds the IVF lists, `sparse`
+    the BM25 index used for hybrid retrieval.
+    """
+
+    def __init__(self, path: str, embedding_model: str = "", nlist: int = 0, sparse: bool = True):
+        self.path = path
+        self.embedding_model = embedding_model
+        self.nlist = nlist
+        self.sparse = sparse
+        self.count = 0
+        self.dimension = 0
+        self._tmp_path = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+        self._vectors = open(os.path.join(self._tmp_path, VECTORS_FILE), "wb")
+        self._documents = open(os.path.join(self._tmp_path, DOCUMENTS_FILE), "w", encoding="utf-8")
+
+    def add(self, documents: Sequence[Document], vectors: Sequence[Sequence[float]]) -> None:
+        matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+        if matrix.shape[0] != len(documents):
+            raise ValueError(f"Got {len(documents)} documents but {matrix.shape[0]} vectors")
+        if not len(documents):
+            return
+        if self.dimension and matrix.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dimension}")
+        self.dimension = int(matrix.shape[1])
+        self._vectors.write(matrix.tobytes())
+        for doc in documents:
+            self._documents.write(json.dumps({"id": doc.id, "text": doc.page_content, "metadata": doc.metadata}) + "\n")
+        self.count += len(documents)
+
+    def close(self) -> str:
+        self._vectors.close()
+        self._documents.close()
+
+        nlist = min(self.nlist, self.count)
+        if nlist > 1:
+            matrix = np.memmap(os.path.join(self._tmp_path, VECTORS_FILE), dtype=np.float32, mode="r",
+                               shape=(self.count, self.dimension))
+            centroids, assignments = _kmeans(matrix, nlist)
+            order = np.argsort(assignments, kind="stable").astype(np.int64)
+            offsets = np.searchsorted(assignments[order], np.arange(nlist + 1)).astype(np.int64)
+            np.save(os.path.join(self._tmp_path, IVF_CENTROIDS_FILE), centroids)
+            np.save(os.path.join(self._tmp_path, IVF_ORDER_FILE), order)
+            np.save(os.path.join(self._tmp_path, IVF_OFFSETS_FILE), offsets)
+            del matrix
+        if self.sparse:
+            build_bm25(self._tmp_path)
+
+        meta = {
+            "count": self.count,
+            "dimension": self.dimension,
+            "embedding_model": self.embedding_model,
+            "nlist": nlist if nlist > 1 else 0,
+        }
+        with open(os.path.join(self._tmp_path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"💾 [MediBlaze] Wrote local index with {self.count} vectors to {self.path}")
+        return self.path
+
+    def abort(self) -> None:
+        """Discard the partially written index."""
+        self._vectors.close()
+        self._documents.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+
+def write_local_index(path: str, documents: Sequence[Document], vectors: Sequence[Sequence[float]],
+                      embedding_model: str = "", nlist: int = 0) -> str:
+    """Write documents + embeddings as a local index directory in one go."""
+    writer = LocalIndexWriter(path, embedding_model=embedding_model, nlist=nlist)
+    try:
+        writer.add(documents, vectors)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+
+class LocalVectorIndex:
+    """Read-only view of an index directory written by write_local_index."""
+
+    def __init__(self, path: str, nprobe: int = 8):
+        self.path = path
+        self.nprobe = nprobe
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            self.meta: Dict = json.load(f)
+        count, dimension = self.meta["count"], self.meta["dimension"]
+        self.vectors = (
+            np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, dimension))
+            if count else np.zeros((0, dimension), dtype=np.float32)
+        )
+        self.documents: List[Document] = []
+        with open(os.path.join(path, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.documents.append(Document(id=record.get("id"), page_content=record["text"], metadata=record.get("metadata") or {}))
+        self.centroids: Optional[np.ndarray] = None
+        if self.meta.get("nlist"):
+            self.centroids = np.load(os.path.join(path, IVF_CENTROIDS_FILE))
+            self.ivf_order = np.load(os.path.join(path, IVF_ORDER_FILE), mmap_mode="r")
+            self.ivf_offsets = np.load(os.path.join(path, IVF_OFFSETS_FILE))
+        self._filter_rows: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows in the nprobe closest IVF lists, or None for an exhaustive scan."""
+        if self.centroids is None or self.nprobe >= len(self.centroids):
+            return None
+        lists = _top_k(self.centroids @ query, self.nprobe)
+        return np.concatenate([self.ivf_order[self.ivf_offsets[i]:self.ivf_offsets[i + 1]] for i in lists])
+
+    def rows_matching(self, metadata_filter: Dict) -> np.ndarray:
+        """Rows whose metadata satisfies the filter, remembered for the most recent filters."""
+        key = filter_key(metadata_filter)
+        rows = self._filter_rows.get(key)
+        if rows is None:
+            rows = np.flatnonzero(filter_mask(self.documents, metadata_filter))
+            if len(self._filter_rows) >= FILTER_CACHE_SIZE:
+                self._filter_rows.pop(next(iter(self._filter_rows)))
+            self._filter_rows[key] = rows
+        return rows
+
+    def search_rows(self, vector: Sequence[float], k: int,
+                    metadata_filter: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine similarities) of the top-k documents for `vector`, best first."""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        rows = self._candidate_rows(query)
+        if metadata_filter:
+            # Only matching rows are scored; a selective filter may leave too few in the probed
+            # IVF lists, then the (small) matching set is scanned exhaustively
+            allowed = self.rows_matching(metadata_filter)
+            rows = allowed if rows is None else np.intersect1d(rows, allowed, assume_unique=True)
+            if len(rows) < k:
+                rows = allowed
+        if rows is None:
+            scores = self.vectors @ query
+            best = _top_k(scores, k)
+            return best, scores[best]
+        scores = self.vectors[rows] @ query
+        best = _top_k(scores, k)
+        return rows[best], scores[best]
+
+    def search_by_vector(self, vector: Sequence[float], k: int,
+                         metadata_filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """Top-k documents by cosine similarity to `vector`, among those matching the filter."""
+        rows, scores = self.search_rows(vector, k, metadata_filter)
+        return [(self.documents[row], float(score)) for row, score in zip(rows, scores)]
+
+
+def resolve_local_index_path(root: str, index_name: str, namespace: str = "", version: Optional[str] = None) -> str:
+    """Directory of a published local index version (newest one when the version is unknown)."""
+    base = os.path.join(root, index_name, namespace or "default")
+    if version and os.path.isdir(os.path.join(base, version)):
+        return os.path.join(base, version)
+    versions = sorted(
+        entry for entry in os.listdir(base)
+        if os.path.isdir(os.path.join(base, entry)) and ".tmp-" not in entry
+    ) if os.path.isdir(base) else []
+    if not versions:
+        raise FileNotFoundError(f"Local index not found: {base}")
+    return os.path.join(base, versions[-1])
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic feature-hashing embeddings (word unigrams + bigrams).
+    No network and no model download - for offline runs, tests and benchmarks.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        tokens = re.findall(r"\w+", text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
@@ -0,0 +1,89 @@
+"""
+🏷️ Metadata filters for knowledge base searches.
+Filters use Pinecone's syntax - {"section": "treatment"}, {"page": {"$gte": 10, "$lte": 20}},
+{"content_type": {"$in": ["text", "list"]}}, combined with "$and" / "$or" - so they are passed
+to Pinecone unchanged and evaluated in-process by the local and BM25 indexes.
+"""
+import json
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Row masks of recently used filters kept per loaded index
+FILTER_CACHE_SIZE = 64
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+}
+
+
+def normalize_heading(text: str) -> str:
+    """Chapter / section headings are stored lower-cased with collapsed whitespace, so filters are case-insensitive."""
+    return " ".join(text.split()).lower()
+
+
+def build_filter(chapter: Optional[str] = None, section: Optional[str] = None, source_file: Optional[str] = None,
+                 content_type: Optional[str] = None, page_from: Optional[int] = None,
+                 page_to: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Filter from the simple arguments the tools expose; None when no argument is set.
+    page_from / page_to are 0-based PDF page indices, as stored in page_start / page_end.
+    """
+    clauses: Dict[str, Any] = {}
+    if chapter:
+        clauses["chapter"] = {"$eq": normalize_heading(chapter)}
+    if section:
+        clauses["section"] = {"$eq": normalize_heading(section)}
+    if source_file:
+        clauses["source_file"] = {"$eq": source_file}
+    if content_type:
+        clauses["content_type"] = {"$eq": content_type}
+    if page_from is not None:
+        clauses["page_end"] = {"$gte": page_from}
+    if page_to is not None:
+        clauses["page_start"] = {"$lte": page_to}
+    return clauses or None
+
+
+def matches(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """Whether a chunk's metadata satisfies the filter (an empty filter matches everything)."""
+    if not metadata_filter:
+        return True
+    for field, condition in metadata_filter.items():
+        if field == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif field == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(field)
+            for operator, operand in condition.items():
+                if operator not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                try:
+                    if not _OPERATORS[operator](value, operand):
+                        return False
+                except TypeError:  # e.g. comparing a string field with a number
+                    return False
+        elif metadata.get(field) != condition:
+            return False
+    return True
+
+
+def filter_key(metadata_filter: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Canonical, hashable form of a filter for cache keys."""
+    return json.dumps(metadata_filter, sort_keys=True) if metadata_filter else None
+
+
+def filter_mask(documents: Sequence[Document], metadata_filter: Dict[str, Any]) -> np.ndarray:
+    """Boolean row mask of the documents matching the filter."""
+    return np.fromiter((matches(doc.metadata, metadata_filter) for doc in documents), dtype=bool, count=len(documents))
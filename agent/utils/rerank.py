@@ -0,0 +1,144 @@
+"""
+🎯 Optional rerank stage for MediBlaze knowledge base searches.
+The vector store is over-fetched (RERANK_CANDIDATES chunks), the candidates are rescored
+against the query and only chunks above RERANK_THRESHOLD reach the prompt. Scoring runs
+under a hard per-request time budget; when the budget runs out the search falls back to
+plain vector order.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agent.utils.sparse_index import tokenize
+
+# "off" (default), "lexical" (query-term overlap, no model) or "cross-encoder" (sentence-transformers on CPU)
+RERANKER = os.getenv("RAG_RERANKER", "off")
+# Chunks fetched from the vector store for rescoring
+RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "30"))
+# Minimum relevance (0-1) a chunk needs to be kept; the best RERANK_MIN_RESULTS chunks are always kept
+RERANK_THRESHOLD = float(os.getenv("RAG_RERANK_THRESHOLD", "0.25"))
+RERANK_MIN_RESULTS = int(os.getenv("RAG_RERANK_MIN_RESULTS", "1"))
+# Scoring budget per search; past it the raw vector order is used
+RERANK_BUDGET_MS = float(os.getenv("RAG_RERANK_BUDGET_MS", "150"))
+CROSS_ENCODER_MODEL = os.getenv("RAG_CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CROSS_ENCODER_BATCH_SIZE = 8
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Rescores vector search candidates; subclasses implement score()."""
+
+    name = "base"
+
+    def __init__(self, threshold: float = RERANK_THRESHOLD, budget_ms: float = RERANK_BUDGET_MS,
+                 min_results: int = RERANK_MIN_RESULTS):
+        self.threshold = threshold
+        self.budget_seconds = budget_ms / 1000
+        self.min_results = min_results
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.timeouts = 0
+        self.candidates = 0
+        self.kept = 0
+
+    def score(self, query: str, docs: Sequence[Document], deadline: float) -> Optional[np.ndarray]:
+        """Relevance in [0, 1] per document, or None if the deadline passed first."""
+        raise NotImplementedError
+
+    def rerank(self, query: str, docs: Sequence[Document], k: int) -> Tuple[List[Document], bool]:
+        """
+        Up to k documents above the threshold, best first. Returns (documents, reranked);
+        reranked is False when the budget ran out and the first k in vector order were used.
+        """
+        started = time.monotonic()
+        scores = self.score(query, docs, started + self.budget_seconds) if docs else np.zeros(0)
+        if scores is None or time.monotonic() - started > self.budget_seconds:
+            with self._lock:
+                self.searches += 1
+                self.timeouts += 1
+            logger.warning(f"⏱️ [MediBlaze] Rerank exceeded {self.budget_seconds * 1000:.0f}ms budget - using vector order")
+            return list(docs[:k]), False
+
+        order = np.argsort(-scores, kind="stable")[:k]
+        kept = [docs[i] for rank, i in enumerate(order) if rank < self.min_results or scores[i] >= self.threshold]
+        with self._lock:
+            self.searches += 1
+            self.candidates += len(docs)
+            self.kept += len(kept)
+        return kept, True
+
+    def stats(self) -> Dict:
+        return {
+            "reranker": self.name,
+            "searches": self.searches,
+            "timeouts": self.timeouts,
+            "avg_kept": round(self.kept / max(self.searches - self.timeouts, 1), 2),
+            "avg_candidates": round(self.candidates / max(self.searches - self.timeouts, 1), 2),
+        }
+
+
+class LexicalReranker(Reranker):
+    """
+    Share of the query's content terms a chunk contains, each term weighted by how rare it
+    is among the candidates - cheap enough to run on every search.
+    """
+
+    name = "lexical"
+
+    def score(self, query, docs, deadline):
+        terms = set(tokenize(query))
+        if not terms:
+            return np.zeros(len(docs))
+        present = np.zeros((len(docs), len(terms)), dtype=bool)
+        ordered_terms = sorted(terms)
+        for row, doc in enumerate(docs):
+            if time.monotonic() > deadline:
+                return None
+            tokens = set(tokenize(doc.page_content))
+            present[row] = [term in tokens for term in ordered_terms]
+        document_freqs = present.sum(axis=0)
+        weights = np.log1p(len(docs) / np.maximum(document_freqs, 1))
+        return present @ weights / weights.sum()
+
+
+class CrossEncoderReranker(Reranker):
+    """Local CPU cross-encoder (sentence-transformers); logits are squashed to [0, 1]."""
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name: str = CROSS_ENCODER_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        from sentence_transformers import CrossEncoder
+        logger.info(f"🎯 [MediBlaze] Loading cross-encoder reranker: {model_name}")
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score(self, query, docs, deadline):
+        scores = []
+        for i in range(0, len(docs), CROSS_ENCODER_BATCH_SIZE):
+            if time.monotonic() > deadline:
+                return None
+            pairs = [(query, doc.page_content) for doc in docs[i:i + CROSS_ENCODER_BATCH_SIZE]]
+            scores.extend(float(logit) for logit in self.model.predict(pairs))
+        return np.asarray([1 / (1 + math.exp(-logit)) for logit in scores])
+
+
+def create_reranker(name: str = RERANKER) -> Optional[Reranker]:
+    """Reranker selected by RAG_RERANKER, or None when reranking is off."""
+    if name in ("", "off", "none"):
+        return None
+    if name == "lexical":
+        return LexicalReranker()
+    if name == "cross-encoder":
+        try:
+            return CrossEncoderReranker()
+        except ImportError:
+            logger.warning("⚠️ [MediBlaze] sentence-transformers not installed - using the lexical reranker")
+            return LexicalReranker()
+    raise ValueError(f"Unknown RAG_RERANKER: {name}")
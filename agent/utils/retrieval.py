@@ -0,0 +1,251 @@
+"""
+📚 Shared retrieval context for the MediBlaze tools.
+The embedding client and the vector backend (Pinecone or the local index) are built once
+per process and reused by every rag_tool / disease_prediction call.
+"""
+import os
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from agent.utils.cache import TTLCache, normalize_query
+from agent.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from agent.utils.index_registry import UNVERSIONED, IndexRegistry
+from agent.utils.metadata_filter import filter_key
+from agent.utils.rerank import RERANK_CANDIDATES, RERANKER, Reranker, create_reranker
+from agent.utils.sparse_index import reciprocal_rank_fusion
+from agent.utils.vector_backends import VECTOR_BACKEND, VectorBackend, create_backend, create_embeddings
+
+load_dotenv()
+
+INDEX_NAME = "mediblaze-bot"
+EMBEDDING_MODEL = "multilingual-e5-large"
+# Knowledge base chunks rag_tool puts into the prompt, under this header
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "7"))
+RAG_RESULT_HEADER = "**📚 From MediBlaze Health Knowledge Base:**\n\n"
+# Query-embedding cache; set EMBEDDING_CACHE_DIR to also keep embeddings on disk across restarts
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR")
+# Top-k result cache; entries are dropped whenever ingestion publishes a new index version
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+# "hybrid" fuses dense and BM25 rankings with reciprocal rank fusion (dense only when the index
+# version has no BM25 files), "dense" skips BM25, "mmr" picks diverse chunks among the dense candidates
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_MODES = ("hybrid", "dense", "mmr")
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# MMR: dense candidates to choose from, and relevance vs. diversity trade-off (1 = pure relevance)
+MMR_FETCH_K = int(os.getenv("MMR_FETCH_K", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+
+def document_key(doc: Document) -> str:
+    """Stable identity of a retrieved chunk: its vector id, else a hash of its text."""
+    if doc.id:
+        return doc.id
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def hybrid_search(backend: VectorBackend, query: str, k: int, index_name: str, namespace: str = "",
+                  version: Optional[str] = None, candidates: int = HYBRID_CANDIDATES,
+                  metadata_filter: Optional[Dict] = None) -> Optional[List[Document]]:
+    """Dense and BM25 candidates merged by reciprocal rank fusion; None when the version has no BM25 index."""
+    candidates = max(k, candidates)
+    sparse = backend.sparse_search(query, candidates, index_name, namespace, version, metadata_filter)
+    if sparse is None:
+        return None
+    dense = backend.similarity_search(query, candidates, index_name, namespace, version, metadata_filter)
+    return reciprocal_rank_fusion([dense, sparse], key=document_key, k=k, rrf_k=RRF_K)
+
+
+def maximal_marginal_relevance(query_vector: np.ndarray, vectors: np.ndarray, k: int,
+                               lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """
+    Indices of k rows chosen greedily by lambda * sim(query) - (1 - lambda) * max sim(already chosen).
+    Similarities are computed once as matrix products; each step is a vectorised argmax.
+    """
+    if not len(vectors) or k <= 0:
+        return []
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance = vectors @ query_vector
+    similarity = vectors @ vectors.T
+    redundancy = np.full(len(vectors), -np.inf)
+    available = np.ones(len(vectors), dtype=bool)
+    chosen = [int(np.argmax(relevance))]
+    for _ in range(min(k, len(vectors)) - 1):
+        available[chosen[-1]] = False
+        redundancy = np.maximum(redundancy, similarity[chosen[-1]])
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        chosen.append(int(np.argmax(scores)))
+    return chosen
+
+
+def mmr_search(backend: VectorBackend, query: str, k: int, index_name: str, namespace: str = "",
+               version: Optional[str] = None, fetch_k: int = MMR_FETCH_K, lambda_mult: float = MMR_LAMBDA,
+               metadata_filter: Optional[Dict] = None) -> List[Document]:
+    """k diverse chunks among the top fetch_k dense candidates."""
+    query_vector, docs, vectors = backend.search_with_vectors(query, max(k, fetch_k), index_name, namespace, version,
+                                                              metadata_filter)
+    return [docs[i] for i in maximal_marginal_relevance(query_vector, vectors, k, lambda_mult)]
+
+
+class RetrievalContext:
+    """Lazily initialised, thread-safe holder for the health knowledge base clients."""
+
+    def __init__(self, index_name: str = INDEX_NAME, embedding_model: str = EMBEDDING_MODEL,
+                 backend: str = VECTOR_BACKEND, mode: str = RETRIEVAL_MODE, reranker: str = RERANKER):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+        self.index_name = index_name
+        self.embedding_model = embedding_model
+        self.backend_name = backend
+        self.mode = mode
+        self.reranker_name = reranker
+        self._lock = threading.RLock()
+        self._embeddings = None
+        self._backend: Optional[VectorBackend] = None
+        self._reranker: Optional[Reranker] = None
+        self._reranker_ready = False
+        # Pinecone keeps the published alias in the index, so every server resolves the same version
+        self.registry = IndexRegistry(remote=self._read_alias if backend == "pinecone" else None)
+        self.result_cache = TTLCache(maxsize=RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL_SECONDS)
+        self._cached_version: Optional[str] = None
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    logger.info("🔧 [MediBlaze] Initializing health knowledge embeddings...")
+                    disk_store = None
+                    if EMBEDDING_CACHE_DIR:
+                        disk_store = DiskEmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, self.embedding_model))
+                    self._embeddings = CachedEmbeddings(
+                        create_embeddings(self.embedding_model),
+                        model=self.embedding_model,
+                        memory_cache=TTLCache(maxsize=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL_SECONDS),
+                        disk_store=disk_store
+                    )
+        return self._embeddings
+
+    @property
+    def backend(self) -> VectorBackend:
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_backend(self.backend_name, self.embeddings)
+        return self._backend
+
+    @property
+    def reranker(self) -> Optional[Reranker]:
+        if not self._reranker_ready:
+            with self._lock:
+                if not self._reranker_ready:
+                    self._reranker = create_reranker(self.reranker_name)
+                    self._reranker_ready = True
+        return self._reranker
+
+    def _read_alias(self, alias: str) -> Optional[Dict]:
+        return self.backend.read_alias(alias)
+
+    def active_index(self) -> Dict:
+        """Index entry currently published for this knowledge base; resets the result cache on change."""
+        entry = self.registry.resolve(self.index_name)
+        if entry["version"] != self._cached_version:
+            with self._lock:
+                if entry["version"] != self._cached_version:
+                    if self._cached_version is not None:
+                        logger.info(f"🔄 [MediBlaze] Index version changed to {entry['version']} - clearing retrieval cache")
+                    if entry["version"] == UNVERSIONED and self.registry.remote is not None:
+                        # Versioned builds never write the default namespace, so this search may find nothing
+                        logger.error(f"❌ [MediBlaze] No published version of {self.index_name} in Pinecone or in "
+                                     f"{self.registry.path} - searching its default namespace; run src/rag_upload.py")
+                    self.result_cache.clear()
+                    self._cached_version = entry["version"]
+        return entry
+
+    def search(self, query: str, k: int, metadata_filter: Optional[Dict] = None) -> List[Document]:
+        """
+        Top-k similarity search against the health knowledge base, served from cache when possible.
+        `metadata_filter` (Pinecone filter syntax) restricts the search to matching chunks.
+        With a reranker configured, fewer than k chunks come back when the rest fall below the threshold.
+        """
+        entry = self.active_index()
+        index_name, namespace = entry["index_name"], entry.get("namespace", "")
+        key = (normalize_query(query), k, index_name, namespace, self.mode, self.reranker_name,
+               filter_key(metadata_filter))
+        docs = self.result_cache.get(key)
+        if docs is None:
+            reranker = self.reranker
+            if reranker is None:
+                docs = self._search(query, k, index_name, namespace, entry["version"], metadata_filter)
+                self.result_cache.set(key, docs)
+            else:
+                # Over-fetch, rescore and keep the relevant chunks; vector order is not cached
+                # when the rerank budget ran out, so the next identical query gets another try
+                candidates = self._search(query, max(k, RERANK_CANDIDATES), index_name, namespace, entry["version"],
+                                          metadata_filter)
+                docs, reranked = reranker.rerank(query, candidates, k)
+                if reranked:
+                    self.result_cache.set(key, docs)
+        return list(docs)
+
+    def _search(self, query: str, k: int, index_name: str, namespace: str, version: Optional[str],
+                metadata_filter: Optional[Dict] = None) -> List[Document]:
+        if self.mode == "hybrid":
+            docs = hybrid_search(self.backend, query, k, index_name, namespace, version, metadata_filter=metadata_filter)
+            if docs is not None:
+                return docs
+        elif self.mode == "mmr":
+            return mmr_search(self.backend, query, k, index_name, namespace, version, metadata_filter=metadata_filter)
+        return self.backend.similarity_search(query, k, index_name, namespace, version, metadata_filter)
+
+    def stats(self) -> Dict:
+        """Cache counters for monitoring; empty until the clients are built."""
+        return {
+            "backend": self.backend_name,
+            "mode": self.mode,
+            "index_version": self._cached_version,
+            "embedding_cache": self._embeddings.stats() if self._embeddings is not None else {},
+            "result_cache": self.result_cache.stats(),
+            "rerank": self._reranker.stats() if self._reranker is not None else {},
+        }
+
+    def warm_up(self) -> None:
+        """Build every client up front and open the index connection."""
+        entry = self.active_index()
+        self.backend.warm_up(entry["index_name"], entry.get("namespace", ""), entry["version"])
+        if self.reranker is not None:
+            logger.info(f"🎯 [MediBlaze] Reranking search results with the {self.reranker.name} reranker")
+        self.embeddings.embed_query("warm up")
+        logger.info(f"✅ [MediBlaze] Retrieval context ready for index: {entry['index_name']} (version {entry['version']})")
+
+
+_context: Optional[RetrievalContext] = None
+_context_lock = threading.Lock()
+
+
+def get_retrieval_context() -> RetrievalContext:
+    """Process-wide RetrievalContext singleton."""
+    global _context
+    if _context is None:
+        with _context_lock:
+            if _context is None:
+                _context = RetrievalContext()
+    return _context
+
+
+def warm_up_retrieval() -> None:
+    """Startup hook: initialise the shared retrieval context before the first request."""
+    get_retrieval_context().warm_up()
@@ -0,0 +1,203 @@
+"""
+🔤 BM25 sparse index for hybrid retrieval in the MediBlaze knowledge base.
+Built at ingestion time from the same chunks as the vector index, so exact drug names,
+abbreviations and ICD-style codes that dense embeddings blur still match. Postings are stored
+as NumPy arrays with precomputed BM25 weights; a query is a scatter-add over its terms' postings.
+"""
+import os
+import re
+import json
+import shutil
+import logging
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from agent.utils.metadata_filter import FILTER_CACHE_SIZE, filter_key, filter_mask
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS_FILE = "documents.jsonl"
+BM25_VOCAB_FILE = "bm25_vocab.json"
+BM25_POSTINGS_FILE = "bm25_postings.npy"
+BM25_WEIGHTS_FILE = "bm25_weights.npy"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Kept deliberately small: medical abbreviations ("ms", "ra", "pe") must stay searchable
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when "
+    "which who will with how can do does i my me you your".split()
+)
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def build_bm25(directory: str, k1: float = BM25_K1, b: float = BM25_B) -> int:
+    """
+    Build the BM25 files next to `directory`/documents.jsonl (one chunk per line, in row
+    order). Returns the number of documents indexed.
+    """
+    vocabulary: Dict[str, int] = {}
+    term_ids, doc_rows, term_freqs = array("i"), array("i"), array("f")
+    lengths = array("f")
+    with open(os.path.join(directory, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+        for row, line in enumerate(f):
+            tokens = tokenize(json.loads(line)["text"])
+            lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_rows.append(row)
+                term_freqs.append(count)
+
+    count = len(lengths)
+    terms = np.frombuffer(term_ids, dtype=np.int32)
+    rows = np.frombuffer(doc_rows, dtype=np.int32)
+    tf = np.frombuffer(term_freqs, dtype=np.float32)
+    doc_lengths = np.frombuffer(lengths, dtype=np.float32)
+    average_length = float(doc_lengths.mean()) if count else 0.0
+
+    order = np.argsort(terms, kind="stable")
+    terms, rows, tf = terms[order], rows[order], tf[order]
+    # Term-frequency part of BM25 is fixed per posting; only the idf multiplies in at query time
+    norm = k1 * (1 - b + b * doc_lengths[rows] / (average_length or 1.0))
+    weights = (tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+    offsets = np.searchsorted(terms, np.arange(len(vocabulary) + 1))
+    document_freqs = np.diff(offsets)
+    idf = np.log(1 + (count - document_freqs + 0.5) / (document_freqs + 0.5))
+
+    vocab = {
+        token: [int(offsets[term]), int(offsets[term + 1]), float(idf[term])]
+        for token, term in vocabulary.items()
+    }
+    with open(os.path.join(directory, BM25_VOCAB_FILE), "w", encoding="utf-8") as f:
+        json.dump({"documents": count, "average_length": average_length, "terms": vocab}, f)
+    np.save(os.path.join(directory, BM25_POSTINGS_FILE), rows)
+    np.save(os.path.join(directory, BM25_WEIGHTS_FILE), weights)
+    return count
+
+
+def has_bm25(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, BM25_VOCAB_FILE))
+
+
+def read_documents(directory: str) -> List[Document]:
+    documents = []
+    with open(os.path.join(directory, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            documents.append(Document(id=record.get("id"), page_content=record["text"], metadata=record.get("metadata") or {}))
+    return documents
+
+
+class BM25Index:
+    """Read-only BM25 index over the chunks of one index version."""
+
+    def __init__(self, directory: str, documents: Optional[Sequence[Document]] = None):
+        self.path = directory
+        with open(os.path.join(directory, BM25_VOCAB_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.terms: Dict[str, List] = meta["terms"]
+        self.count: int = meta["documents"]
+        self.postings = np.load(os.path.join(directory, BM25_POSTINGS_FILE), mmap_mode="r")
+        self.weights = np.load(os.path.join(directory, BM25_WEIGHTS_FILE), mmap_mode="r")
+        # The local vector index shares its document list; otherwise load it from the directory
+        self.documents = documents if documents is not None else read_documents(directory)
+        self._filter_masks: Dict[str, np.ndarray] = {}
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for token in set(tokenize(query)):
+            entry = self.terms.get(token)
+            if entry is None:
+                continue
+            start, stop, idf = entry
+            scores[self.postings[start:stop]] += idf * self.weights[start:stop]
+        return scores
+
+    def mask(self, metadata_filter: Dict) -> np.ndarray:
+        key = filter_key(metadata_filter)
+        mask = self._filter_masks.get(key)
+        if mask is None:
+            mask = filter_mask(self.documents, metadata_filter)
+            if len(self._filter_masks) >= FILTER_CACHE_SIZE:
+                self._filter_masks.pop(next(iter(self._filter_masks)))
+            self._filter_masks[key] = mask
+        return mask
+
+    def search(self, query: str, k: int, metadata_filter: Optional[Dict] = None) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score (chunks matching no query term are never returned)."""
+        if not self.count:
+            return []
+        scores = self.scores(query)
+        if metadata_filter:
+            scores[~self.mask(metadata_filter)] = 0.0
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self.documents[row], float(scores[row])) for row in best]
+
+
+class SparseIndexWriter:
+    """
+    Collects chunks for a BM25 index in `path`. Chunks are appended to a build directory
+    that survives interrupted runs; close() drops repeated IDs, builds the postings and
+    moves the directory into place.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._build_path = f"{path}.building"
+        os.makedirs(self._build_path, exist_ok=True)
+        self._documents = open(os.path.join(self._build_path, DOCUMENTS_FILE), "a", encoding="utf-8")
+
+    def add(self, documents: Iterable[Document]) -> None:
+        for doc in documents:
+            self._documents.write(json.dumps({"id": doc.id, "text": doc.page_content, "metadata": doc.metadata}) + "\n")
+        self._documents.flush()
+
+    def close(self) -> str:
+        self._documents.close()
+        documents_path = os.path.join(self._build_path, DOCUMENTS_FILE)
+        seen = set()
+        with open(documents_path, "r", encoding="utf-8") as src, \
+                open(f"{documents_path}.dedup", "w", encoding="utf-8") as dst:
+            for line in src:
+                doc_id = json.loads(line).get("id")
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    dst.write(line)
+        os.replace(f"{documents_path}.dedup", documents_path)
+        count = build_bm25(self._build_path)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._build_path, self.path)
+        logger.info(f"🔤 [MediBlaze] Wrote BM25 index with {count} chunks to {self.path}")
+        return self.path
+
+    def abort(self) -> None:
+        self._documents.close()
+        shutil.rmtree(self._build_path, ignore_errors=True)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], key, k: int, rrf_k: int = 60) -> List[Document]:
+    """Merge ranked lists: each document scores sum(1 / (rrf_k + rank)) over the lists it appears in."""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(doc_key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[doc_key] for doc_key in best]
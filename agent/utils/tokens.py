@@ -0,0 +1,29 @@
+"""
+🔢 Token counting with the chat model's tiktoken encoding, shared by ingestion (chunk sizing)
+and retrieval (prompt budgets). Falls back to a chars/4 estimate when the encoding can't be loaded.
+"""
+import os
+import logging
+from functools import lru_cache
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ENCODING = os.getenv("INGEST_TOKEN_ENCODING", "o200k_base")  # gpt-4o / gpt-4o-mini
+
+
+@lru_cache(maxsize=None)
+def token_counter(encoding_name: str = TOKEN_ENCODING) -> Optional[Callable[[str], int]]:
+    """len(tokens) for a text, or None when the tiktoken encoding can't be loaded (offline)."""
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"⚠️ [MediBlaze] tiktoken encoding {encoding_name} unavailable, estimating tokens as chars/4: {str(e)}")
+        return None
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    counter = token_counter()
+    return counter(text) if counter is not None else max(1, round(len(text) / 4))
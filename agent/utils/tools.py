@@ -1,16 +1,18 @@
-import os
 from dotenv import load_dotenv
+from typing import Annotated, List, Optional
 
-from langchain_core.tools import tool
+from langchain_core.documents import Document
+from langchain_core.tools import tool, InjectedToolArg, ToolException
 from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 from langchain_community.tools import DuckDuckGoSearchResults
-from langchain_pinecone import PineconeVectorStore, PineconeEmbeddings
-from langchain_core.tools import create_retriever_tool
 import logging
 
+from agent.utils.compression import build_context
+from agent.utils.metadata_filter import build_filter
+from agent.utils.retrieval import RAG_RESULT_HEADER, RAG_TOP_K, get_retrieval_context, document_key
+
 # Load environment variables
 load_dotenv()
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
 # Configure logging for MediBlaze medical bot
 logging.basicConfig(
@@ -23,6 +25,11 @@ logger = logging.getLogger(__name__)
 wrapper = DuckDuckGoSearchAPIWrapper(max_results=3)
 duckduckgo_search = DuckDuckGoSearchResults(api_wrapper=wrapper)
 
+# Knowledge base documents disease_prediction puts into its analysis context
+PREDICTION_CONTEXT_DOCS = 5
+# Sections disease_prediction searches first: where reference entries describe symptoms and diagnosis
+PREDICTION_SECTIONS = ["causes and symptoms", "symptoms", "causes", "diagnosis", "description", "definition"]
+
 @tool
 def medical_web_search(query: str) -> str:
     """
@@ -53,45 +60,44 @@ def medical_web_search(query: str) -> str:
         
     except Exception as e:
         logger.error(f"❌ [MediBlaze] Error during medical web search: {str(e)}")
-        return "⚠️ An error occurred while searching for health information online. Please try again or consult with a healthcare professional."
+        raise ToolException("⚠️ An error occurred while searching for health information online. Please try again or consult with a healthcare professional.")
 
-@tool
-def rag_tool(query: str) -> str:
+# A raised ToolException becomes the tool result, marked status="error" so the turn is not cached
+medical_web_search.handle_tool_error = True
+
+@tool(response_format="content_and_artifact")
+def rag_tool(query: str, chapter: Optional[str] = None, section: Optional[str] = None,
+             source_file: Optional[str] = None, page_from: Optional[int] = None, page_to: Optional[int] = None) -> tuple:
     """
     📚 Retrieve relevant health information from the MediBlaze knowledge base.
     This contains comprehensive medical documents and health information covering diseases, treatments, symptoms, and wellness.
+
+    Optional filters narrow the search (leave them empty for a general search):
+    - chapter: encyclopedia entry / topic title, e.g. "Migraine headache", "Dengue fever"
+    - section: section of an entry, e.g. "Causes and symptoms", "Diagnosis", "Treatment", "Prevention"
+    - source_file: a specific document of the knowledge base
+    - page_from / page_to: 0-based PDF page indices (the first page of the file is 0), not the page
+      numbers printed in the book; prefer chapter / section when the user cites a printed page
     """
     try:
-        logger.info("🔧 [MediBlaze] Initializing health knowledge embeddings...")
-        embeddings = PineconeEmbeddings(model="multilingual-e5-large")
-        
-        index_name = "mediblaze-bot"
-        logger.info(f"🔗 [MediBlaze] Connecting to health knowledge base: {index_name}")
-        
-        # Connect to Pinecone health knowledge base
-        vectorstore = PineconeVectorStore(
-            index_name=index_name,
-            embedding=embeddings,
-            pinecone_api_key=PINECONE_API_KEY
-        )
-        
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 7})  # Get more relevant health docs
-        
-        _rag_tool_instance = create_retriever_tool(
-            retriever,
-            "search_health_knowledge_base",
-            "🏥 Searches MediBlaze health knowledge base for comprehensive information about diseases, treatments, medications, symptoms, prevention, diagnosis, lifestyle health, and wellness information."
-        )
-        
         logger.info(f"📖 [MediBlaze] Executing health knowledge search for: {query}")
-        result = _rag_tool_instance.invoke(query)        
+        metadata_filter = build_filter(chapter=chapter, section=section, source_file=source_file,
+                                       page_from=page_from, page_to=page_to)
+        docs = get_retrieval_context().search(query, k=RAG_TOP_K, metadata_filter=metadata_filter)
+        if not docs and metadata_filter:
+            logger.info(f"🏷️ [MediBlaze] No chunks match {metadata_filter} - searching the whole knowledge base")
+            docs = get_retrieval_context().search(query, k=RAG_TOP_K)
+        # Only the query-relevant sentences go into the prompt; the full chunks stay in the artifact
+        result = build_context(query, docs)
+        
         # If no relevant results found, provide helpful fallback
         if not result or len(str(result).strip()) < 20:
             logger.warning("⚠️ [MediBlaze] No relevant results found in health knowledge base")
-            return "📚 I couldn't find specific information about that in our health knowledge base. Let me search for current health information online to help you better."
+            return "📚 I couldn't find specific information about that in our health knowledge base. Let me search for current health information online to help you better.", []
         
         logger.info("✅ [MediBlaze] Health knowledge search completed successfully")
-        return f"**📚 From MediBlaze Health Knowledge Base:**\n\n{result}"
+        # Documents go to the agent's retrieval scratchpad for reuse later in the turn
+        return f"{RAG_RESULT_HEADER}{result}", docs
     
     except Exception as e:
         error_msg = str(e)
@@ -100,12 +106,15 @@ def rag_tool(query: str) -> str:
         # Handle missing Pinecone index gracefully
         if "NOT_FOUND" in error_msg or "not found" in error_msg.lower():
             logger.warning("⚠️ [MediBlaze] Pinecone index not found - falling back to web search only")
-            return "📚 The health knowledge base is currently unavailable. I'll use web search to find current medical information for you."
+            raise ToolException("📚 The health knowledge base is currently unavailable. I'll use web search to find current medical information for you.")
         
-        return "⚠️ An error occurred while searching our health knowledge base. Let me search the web for current health information instead."
+        raise ToolException("⚠️ An error occurred while searching our health knowledge base. Let me search the web for current health information instead.")
 
-@tool
-def disease_prediction(symptoms: str, duration: str, severity: str, additional_info: str = "") -> str:
+rag_tool.handle_tool_error = True
+
+@tool(response_format="content_and_artifact")
+def disease_prediction(symptoms: str, duration: str, severity: str, additional_info: str = "",
+                       retrieved_docs: Annotated[Optional[List[Document]], InjectedToolArg] = None) -> tuple:
     """
     🔬 Analyze symptoms and predict most likely medical conditions with risk assessment.
     
@@ -126,26 +135,37 @@ def disease_prediction(symptoms: str, duration: str, severity: str, additional_i
     - duration: How long symptoms have persisted (e.g., "2 days", "1 week")
     - severity: Intensity level (e.g., "moderate", "severe", "7/10 pain")
     - additional_info: Contact history, medications, negatives (e.g., "colleague had viral fever, took paracetamol, no cough")
+    - retrieved_docs: Injected by the agent - knowledge base documents already fetched this turn
     """
     try:
         logger.info(f"🔬 [MediBlaze] Analyzing symptoms for disease prediction: {symptoms}")
         
-        # Use RAG to get relevant medical information
-        embeddings = PineconeEmbeddings(model="multilingual-e5-large")
-        vectorstore = PineconeVectorStore(
-            index_name="mediblaze-bot",
-            embedding=embeddings,
-            pinecone_api_key=PINECONE_API_KEY
-        )
-        
         # Enhanced query for disease prediction
         prediction_query = f"diseases conditions with symptoms: {symptoms}, duration {duration}, severity {severity}. Differential diagnosis, causes, treatment."
         
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 10})  # Get more docs for better prediction
-        docs = retriever.invoke(prediction_query)
+        # Reuse documents rag_tool already fetched this turn; only search for what is still missing
+        docs = list(retrieved_docs or [])[:PREDICTION_CONTEXT_DOCS]
+        fetched = []
+        if len(docs) < PREDICTION_CONTEXT_DOCS:
+            seen = {document_key(doc) for doc in docs}
+            # Symptom and diagnosis sections first, the whole knowledge base only if they fall short
+            for metadata_filter in ({"section": {"$in": PREDICTION_SECTIONS}}, None):
+                for doc in get_retrieval_context().search(prediction_query, k=PREDICTION_CONTEXT_DOCS,
+                                                          metadata_filter=metadata_filter):
+                    if len(docs) >= PREDICTION_CONTEXT_DOCS:
+                        break
+                    if document_key(doc) not in seen:
+                        seen.add(document_key(doc))
+                        docs.append(doc)
+                        fetched.append(doc)
+                if len(docs) >= PREDICTION_CONTEXT_DOCS:
+                    break
+        else:
+            logger.info("♻️ [MediBlaze] Reusing knowledge base documents retrieved earlier this turn")
         
         # Build knowledge context
-        knowledge_context = "\n\n".join([doc.page_content for doc in docs[:5]]) if docs else "Limited information available"
+        knowledge_context = build_context(f"{symptoms} {additional_info}", docs) if docs else ""
+        knowledge_context = knowledge_context or "Limited information available"
         
         # Symptom severity scoring
         severity_lower = severity.lower()
@@ -343,8 +363,8 @@ This is an AI-assisted prediction based on symptom patterns. It is NOT a definit
 """
         
         logger.info("✅ [MediBlaze] Disease prediction analysis completed")
-        return prediction_response
+        return prediction_response, fetched
         
     except Exception as e:
         logger.error(f"❌ [MediBlaze] Error in disease prediction: {str(e)}")
-        return f"⚠️ Unable to perform disease prediction analysis at this time. Error: {str(e)}\n\nPlease consult with a healthcare professional for proper diagnosis."
\ No newline at end of file
+        return f"⚠️ Unable to perform disease prediction analysis at this time. Error: {str(e)}\n\nPlease consult with a healthcare professional for proper diagnosis.", []
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+🔌 Vector backends for the MediBlaze knowledge base.
+VECTOR_BACKEND selects where rag_tool / disease_prediction search: "pinecone" (default) or
+"local" (an in-process index written by src/rag_upload.py). EMBEDDING_PROVIDER=hashing swaps the
+remote embedding API for a deterministic offline stand-in.
+"""
+import os
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from agent.utils.index_registry import STATE_DIR, read_pinecone_alias
+from agent.utils.local_index import HashingEmbeddings, LocalVectorIndex, resolve_local_index_path
+from agent.utils.sparse_index import BM25Index, has_bm25
+
+load_dotenv()
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "pinecone")
+HASHING_EMBEDDING_DIMENSION = int(os.getenv("HASHING_EMBEDDING_DIMENSION", "384"))
+# Size of the HTTP connection pool shared by all concurrent index queries
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", os.path.join(STATE_DIR, "local_index"))
+# IVF lists probed per query when the local index was built with lists
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+# BM25 indexes built by src/rag_upload.py next to each Pinecone namespace (local indexes hold their own)
+SPARSE_INDEX_DIR = os.getenv("SPARSE_INDEX_DIR", os.path.join(STATE_DIR, "sparse_index"))
+
+logger = logging.getLogger(__name__)
+
+
+def create_embeddings(model: str, provider: str = EMBEDDING_PROVIDER) -> Embeddings:
+    """Embedding client for `model` from the configured provider."""
+    if provider == "hashing":
+        return HashingEmbeddings(dimension=HASHING_EMBEDDING_DIMENSION)
+    if provider == "pinecone":
+        from langchain_pinecone import PineconeEmbeddings
+        return PineconeEmbeddings(model=model)
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+
+
+class VectorBackend:
+    """Search interface shared by all knowledge base backends."""
+
+    name = "base"
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self._lock = threading.RLock()
+        self._sparse_indexes: Dict[tuple, Optional[BM25Index]] = {}
+
+    def similarity_search(self, query: str, k: int, index_name: str, namespace: str = "",
+                          version: Optional[str] = None, metadata_filter: Optional[Dict] = None) -> List[Document]:
+        """Top-k chunks by vector similarity, restricted to chunks matching `metadata_filter`."""
+        raise NotImplementedError
+
+    def search_with_vectors(self, query: str, k: int, index_name: str, namespace: str = "", version: Optional[str] = None,
+                            metadata_filter: Optional[Dict] = None) -> Tuple[np.ndarray, List[Document], np.ndarray]:
+        """(query embedding, top-k documents, their stored embeddings) - input for MMR."""
+        raise NotImplementedError
+
+    def warm_up(self, index_name: str, namespace: str = "", version: Optional[str] = None) -> None:
+        """Open connections / load files for the given index ahead of the first search."""
+
+    def sparse_index_path(self, index_name: str, namespace: str = "", version: Optional[str] = None) -> Optional[str]:
+        """Directory of the BM25 index for an index version, if the backend keeps one."""
+        return None
+
+    def get_sparse_index(self, index_name: str, namespace: str = "", version: Optional[str] = None) -> Optional[BM25Index]:
+        """Load (once per version) the BM25 index for an index version; None when it has none."""
+        key = (index_name, namespace, version)
+        if key not in self._sparse_indexes:
+            with self._lock:
+                if key not in self._sparse_indexes:
+                    path = self.sparse_index_path(index_name, namespace, version)
+                    index = None
+                    if path and has_bm25(path):
+                        logger.info(f"🔤 [MediBlaze] Loading BM25 index: {path}")
+                        index = BM25Index(path, documents=self._sparse_documents(index_name, namespace, version))
+                    # Only the current version stays loaded
+                    indexes = {k: v for k, v in self._sparse_indexes.items() if k[:2] != key[:2]}
+                    indexes[key] = index
+                    self._sparse_indexes = indexes
+        return self._sparse_indexes[key]
+
+    def _sparse_documents(self, index_name: str, namespace: str, version: Optional[str]) -> Optional[List[Document]]:
+        """Chunk list the BM25 index can share instead of reading its own copy."""
+        return None
+
+    def sparse_search(self, query: str, k: int, index_name: str, namespace: str = "", version: Optional[str] = None,
+                      metadata_filter: Optional[Dict] = None) -> Optional[List[Document]]:
+        """BM25 top-k for the index version, or None when it has no sparse index."""
+        index = self.get_sparse_index(index_name, namespace, version)
+        if index is None:
+            return None
+        return [doc for doc, _ in index.search(query, k, metadata_filter)]
+
+
+class PineconeBackend(VectorBackend):
+    """Pinecone serverless index with a pooled client shared across requests."""
+
+    name = "pinecone"
+
+    def __init__(self, embeddings: Embeddings, api_key: Optional[str] = PINECONE_API_KEY,
+                 pool_threads: int = PINECONE_POOL_THREADS):
+        super().__init__(embeddings)
+        self.api_key = api_key
+        self.pool_threads = pool_threads
+        self._client = None
+        self._indexes: Dict[str, object] = {}
+        self._vectorstores: Dict[str, object] = {}
+        self._retrievers: Dict[tuple, object] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from pinecone import Pinecone
+                    self._client = Pinecone(api_key=self.api_key, pool_threads=self.pool_threads)
+        return self._client
+
+    def get_index(self, index_name: str):
+        """Return the (cached) pooled handle for a Pinecone index."""
+        index = self._indexes.get(index_name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(index_name)
+                if index is None:
+                    logger.info(f"🔗 [MediBlaze] Connecting to health knowledge base: {index_name}")
+                    index = self.client.Index(index_name, pool_threads=self.pool_threads)
+                    self._indexes[index_name] = index
+        return index
+
+    def get_vectorstore(self, index_name: str):
+        vectorstore = self._vectorstores.get(index_name)
+        if vectorstore is None:
+            with self._lock:
+                vectorstore = self._vectorstores.get(index_name)
+                if vectorstore is None:
+                    from langchain_pinecone import PineconeVectorStore
+                    vectorstore = PineconeVectorStore(index=self.get_index(index_name), embedding=self.embeddings)
+                    self._vectorstores[index_name] = vectorstore
+        return vectorstore
+
+    def get_retriever(self, k: int, index_name: str, namespace: str = ""):
+        """Return the (cached) retriever for top-k search in one index namespace."""
+        key = (index_name, namespace, k)
+        retriever = self._retrievers.get(key)
+        if retriever is None:
+            with self._lock:
+                retriever = self._retrievers.get(key)
+                if retriever is None:
+                    search_kwargs = {"k": k, "namespace": namespace} if namespace else {"k": k}
+                    retriever = self.get_vectorstore(index_name).as_retriever(search_kwargs=search_kwargs)
+                    self._retrievers[key] = retriever
+        return retriever
+
+    def similarity_search(self, query, k, index_name, namespace="", version=None, metadata_filter=None):
+        if metadata_filter:
+            # Filtered searches are evaluated server-side by Pinecone
+            return self.get_vectorstore(index_name).similarity_search(
+                query, k=k, filter=metadata_filter, namespace=namespace or None
+            )
+        return self.get_retriever(k, index_name, namespace).invoke(query)
+
+    def search_with_vectors(self, query, k, index_name, namespace="", version=None, metadata_filter=None):
+        query_vector = self.embeddings.embed_query(query)
+        response = self.get_index(index_name).query(
+            vector=query_vector, top_k=k, namespace=namespace or None, filter=metadata_filter or None,
+            include_values=True, include_metadata=True
+        )
+        docs, vectors = [], []
+        for match in response.matches:
+            metadata = dict(match.metadata or {})
+            docs.append(Document(id=match.id, page_content=metadata.pop("text", ""), metadata=metadata))
+            vectors.append(match.values)
+        return np.asarray(query_vector, dtype=np.float32), docs, np.asarray(vectors, dtype=np.float32)
+
+    def read_alias(self, alias: str) -> Optional[Dict]:
+        """Published entry stored in the index behind `alias` (shared by every server)."""
+        return read_pinecone_alias(self.get_index(alias), alias)
+
+    def warm_up(self, index_name, namespace="", version=None):
+        self.get_vectorstore(index_name)
+        self.get_index(index_name).describe_index_stats()
+        self.get_sparse_index(index_name, namespace, version)
+
+    def sparse_index_path(self, index_name, namespace="", version=None):
+        return os.path.join(SPARSE_INDEX_DIR, index_name, namespace or "default")
+
+
+class LocalBackend(VectorBackend):
+    """In-process NumPy index loaded from LOCAL_INDEX_DIR - no network hop per search."""
+
+    name = "local"
+
+    def __init__(self, embeddings: Embeddings, root: str = LOCAL_INDEX_DIR, nprobe: int = LOCAL_INDEX_NPROBE):
+        super().__init__(embeddings)
+        self.root = root
+        self.nprobe = nprobe
+        self._indexes: Dict[tuple, LocalVectorIndex] = {}
+
+    def get_index(self, index_name: str, namespace: str = "", version: Optional[str] = None) -> LocalVectorIndex:
+        """Load (once per version) the local index directory for an index namespace."""
+        key = (index_name, namespace, version)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    path = resolve_local_index_path(self.root, index_name, namespace, version)
+                    logger.info(f"💾 [MediBlaze] Loading local health knowledge base: {path}")
+                    index = LocalVectorIndex(path, nprobe=self.nprobe)
+                    # Only the current version stays loaded
+                    self._indexes = {k: v for k, v in self._indexes.items() if k[:2] != key[:2]}
+                    self._indexes[key] = index
+        return index
+
+    def similarity_search(self, query, k, index_name, namespace="", version=None, metadata_filter=None):
+        index = self.get_index(index_name, namespace, version)
+        return [doc for doc, _ in index.search_by_vector(self.embeddings.embed_query(query), k, metadata_filter)]
+
+    def search_with_vectors(self, query, k, index_name, namespace="", version=None, metadata_filter=None):
+        index = self.get_index(index_name, namespace, version)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        rows, _ = index.search_rows(query_vector, k, metadata_filter)
+        # Rows of the memory-mapped matrix, no re-embedding of the candidates
+        return query_vector, [index.documents[row] for row in rows], np.asarray(index.vectors[rows])
+
+    def warm_up(self, index_name, namespace="", version=None):
+        self.get_index(index_name, namespace, version)
+        self.get_sparse_index(index_name, namespace, version)
+
+    def sparse_index_path(self, index_name, namespace="", version=None):
+        # BM25 files live inside the local index directory of the same version
+        return self.get_index(index_name, namespace, version).path
+
+    def _sparse_documents(self, index_name, namespace, version):
+        return self.get_index(index_name, namespace, version).documents
+
+
+def create_backend(name: str, embeddings: Embeddings) -> VectorBackend:
+    """Instantiate the vector backend selected by VECTOR_BACKEND."""
+    if name == "pinecone":
+        return PineconeBackend(embeddings)
+    if name == "local":
+        return LocalBackend(embeddings)
+    raise ValueError(f"Unknown VECTOR_BACKEND: {name}")
@@ -16,21 +16,43 @@ import markdown
 from datetime import datetime
 import json
 import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
-from langchain_core.messages import HumanMessage, AIMessage
-from agent.agent import agent
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from agent.agent import agent, AGENT_PROMPT_VERSION, TOOL_THREAD_POOL_SIZE
+from agent.utils.answer_cache import ANSWER_CACHE_ENABLED, SemanticAnswerCache
+from agent.utils.retrieval import get_retrieval_context, warm_up_retrieval
 
 # Configure logging
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """🚀 Install the bounded default thread pool and warm up the knowledge base"""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=DEFAULT_EXECUTOR_THREADS, thread_name_prefix="mediblaze-default")
+    )
+    logger.info(f"⚙️ [MediBlaze API] Agent runs limited to {AGENT_MAX_CONCURRENCY} concurrent, {DEFAULT_EXECUTOR_THREADS} default executor threads")
+    try:
+        # Build the shared Pinecone/embedding clients before the first chat request
+        await loop.run_in_executor(None, warm_up_retrieval)
+    except Exception as e:
+        # Keep serving - tools retry initialisation lazily and fall back to web search
+        logger.warning(f"⚠️ [MediBlaze API] Knowledge base warm-up failed: {str(e)}")
+    yield
+
 # Initialize FastAPI app
 app = FastAPI(
     title="🏥 MediBlaze API",
     description="Advanced Medical AI Assistant with RAG and Web Search capabilities (Powered by GitHub Models)",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -49,6 +71,8 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 class ChatMessage(BaseModel):
     message: str
     timestamp: datetime = None
+    # Conversation the message belongs to (the web UI sends one per browser tab)
+    session_id: str = "default_session"
 
 class ChatResponse(BaseModel):
     response: str
@@ -65,6 +89,93 @@ class HealthCheck(BaseModel):
 
 # Store conversation history (in production, use proper session management)
 conversation_history: Dict[str, List[Dict]] = {}
+# Sessions kept in memory; the least recently active ones are dropped first
+MAX_CONVERSATION_SESSIONS = int(os.getenv("MAX_CONVERSATION_SESSIONS", "1000"))
+
+# Status text shown in the UI while a tool is running
+TOOL_STATUS_MESSAGES = {
+    "rag_tool": "🤔Thinking",
+    "disease_prediction": "🔬 Analyzing symptoms...",
+    "medical_web_search": "Searching web for latest medical information...",
+}
+
+# Agent execution settings
+# The graph runs on the event loop via ainvoke. Blocking tool calls (Pinecone, DuckDuckGo) run
+# in agent.agent's tool_executor (TOOL_THREAD_POOL_SIZE); the default executor (DEFAULT_EXECUTOR_THREADS)
+# only takes the remaining blocking work - knowledge base warm-up and answer cache lookups/stores.
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "32"))
+DEFAULT_EXECUTOR_THREADS = int(os.getenv("DEFAULT_EXECUTOR_THREADS", "16"))
+
+agent_semaphore = asyncio.Semaphore(AGENT_MAX_CONCURRENCY)
+agent_run_stats = {"active": 0, "queued": 0, "completed": 0, "failed": 0}
+
+# Answers to history-free turns, reused for near-duplicate first questions until the index
+# version or the agent prompt/model changes
+answer_cache = SemanticAnswerCache(
+    embeddings=lambda: get_retrieval_context().embeddings,
+    version=lambda: (get_retrieval_context().active_index()["version"], AGENT_PROMPT_VERSION),
+)
+
+async def lookup_cached_answer(question: str, history: List[Dict]):
+    """Cached answer entry for a history-free turn (None for follow-ups, misses and cache errors)."""
+    if not ANSWER_CACHE_ENABLED or history:
+        return None
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, answer_cache.get, question)
+    except Exception as e:
+        logger.warning(f"⚠️ [MediBlaze API] Answer cache lookup failed: {str(e)}")
+        return None
+
+async def store_cached_answer(question: str, history: List[Dict], answer: str, tools_used: List[str],
+                              agent_messages: List[Any]) -> None:
+    """Remember the answer to a history-free turn, unless a tool failed or timed out during it."""
+    if not ANSWER_CACHE_ENABLED or history:
+        return
+    if any(isinstance(msg, ToolMessage) and msg.status == "error" for msg in agent_messages):
+        logger.info("💬 [MediBlaze API] Not caching answer: a tool failed during the turn")
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, answer_cache.set, question, answer, tools_used)
+    except Exception as e:
+        logger.warning(f"⚠️ [MediBlaze API] Answer cache store failed: {str(e)}")
+
+def remember_turn(session_id: str, user_message: str, bot_response: str, tools_used: List[str], timestamp: datetime) -> None:
+    """Store a turn in the session's conversation history (keep last 10 exchanges)."""
+    history = conversation_history.pop(session_id, [])
+    history.append({
+        "user_message": user_message,
+        "bot_response": bot_response,
+        "timestamp": timestamp,
+        "tools_used": tools_used
+    })
+    # Re-inserting keeps the dict ordered from least to most recently active session
+    conversation_history[session_id] = history[-10:]
+    while len(conversation_history) > MAX_CONVERSATION_SESSIONS:
+        del conversation_history[next(iter(conversation_history))]
+
+@asynccontextmanager
+async def agent_slot():
+    """Acquire one of the AGENT_MAX_CONCURRENCY agent slots, tracking queue depth."""
+    agent_run_stats["queued"] += 1
+    try:
+        await agent_semaphore.acquire()
+    finally:
+        agent_run_stats["queued"] -= 1
+    agent_run_stats["active"] += 1
+    try:
+        yield
+        agent_run_stats["completed"] += 1
+    except BaseException:
+        agent_run_stats["failed"] += 1
+        raise
+    finally:
+        agent_run_stats["active"] -= 1
+        agent_semaphore.release()
+
+async def run_agent(messages: List) -> Dict[str, Any]:
+    """Run the MediBlaze agent graph without blocking the event loop."""
+    async with agent_slot():
+        return await agent.ainvoke({"messages": messages})
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -150,13 +261,30 @@ async def health_check():
                 "agent": agent_status,
                 "environment": env_status,
                 "api": "✅ Online",
-                "llm_provider": "GitHub Models (GPT-4)"
+                "llm_provider": "GitHub Models (GPT-4)",
+                "agent_runs": f"{agent_run_stats['active']} active / {agent_run_stats['queued']} queued"
             }
         )
     except Exception as e:
         logger.error(f"❌ [MediBlaze API] Health check failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Health check failed")
 
+@app.get("/metrics")
+async def get_metrics():
+    """📈 Runtime metrics for MediBlaze agent execution"""
+    return JSONResponse(content={
+        "agent": {
+            **agent_run_stats,
+            "max_concurrency": AGENT_MAX_CONCURRENCY
+        },
+        "executors": {
+            "default_threads": DEFAULT_EXECUTOR_THREADS,
+            "tool_threads": TOOL_THREAD_POOL_SIZE
+        },
+        "retrieval": get_retrieval_context().stats(),
+        "answer_cache": {"enabled": ANSWER_CACHE_ENABLED, **answer_cache.stats()}
+    })
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_mediblaze(message: ChatMessage):
     """
@@ -169,8 +297,7 @@ async def chat_with_mediblaze(message: ChatMessage):
     try:
         logger.info(f"💬 [MediBlaze API] Processing message: {message.message[:100]}...")
         
-        # Create a session ID (simple approach - in production use proper session management)
-        session_id = "default_session"
+        session_id = message.session_id
         
         # Initialize conversation history if needed
         if session_id not in conversation_history:
@@ -186,24 +313,30 @@ async def chat_with_mediblaze(message: ChatMessage):
         # Add current message
         messages.append(HumanMessage(content=message.message))
         
-        # Process the message with the agent including conversation history
-        response = agent.invoke({
-            "messages": messages
-        })
-        
-        # Extract the final response
-        if response and "messages" in response:
-            final_message = response["messages"][-1]
-            response_text = final_message.content
-            
-            # Check for tool usage in the conversation
-            for msg in response["messages"]:
-                if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                    for tool_call in msg.tool_calls:
-                        if tool_call["name"] not in tools_used:
-                            tools_used.append(tool_call["name"])
+        # First questions are served from the answer cache when one close enough was answered before
+        history_before = list(conversation_history[session_id])
+        cached = await lookup_cached_answer(message.message, history_before)
+        if cached is not None:
+            response_text = cached["answer"]
+            tools_used = list(cached["tools_used"])
         else:
-            response_text = "I apologize, but I'm having trouble processing your request right now. Please try again."
+            # Process the message with the agent including conversation history
+            response = await run_agent(messages)
+            
+            # Extract the final response
+            if response and "messages" in response:
+                final_message = response["messages"][-1]
+                response_text = final_message.content
+                
+                # Check for tool usage in the conversation
+                for msg in response["messages"]:
+                    if hasattr(msg, 'tool_calls') and msg.tool_calls:
+                        for tool_call in msg.tool_calls:
+                            if tool_call["name"] not in tools_used:
+                                tools_used.append(tool_call["name"])
+                await store_cached_answer(message.message, history_before, response_text, tools_used, response["messages"])
+            else:
+                response_text = "I apologize, but I'm having trouble processing your request right now. Please try again."
         
         # Convert markdown to HTML for frontend display
         response_html = markdown.markdown(
@@ -215,16 +348,7 @@ async def chat_with_mediblaze(message: ChatMessage):
         processing_time = (datetime.now() - start_time).total_seconds()
         
         # Store in conversation history
-        conversation_history[session_id].append({
-            "user_message": message.message,
-            "bot_response": response_text,
-            "timestamp": start_time,
-            "tools_used": tools_used
-        })
-        
-        # Limit conversation history (keep last 10 messages)
-        if len(conversation_history[session_id]) > 10:
-            conversation_history[session_id] = conversation_history[session_id][-10:]
+        remember_turn(session_id, message.message, response_text, tools_used, start_time)
         
         logger.info(f"✅ [MediBlaze API] Response generated in {processing_time:.2f}s using tools: {tools_used}")
         
@@ -260,8 +384,7 @@ async def stream_chat_with_mediblaze(message: ChatMessage):
         try:
             logger.info(f"💬 [MediBlaze Stream] Processing: {message.message[:100]}...")
             
-            # Create a session ID
-            session_id = "default_session"
+            session_id = message.session_id
             
             # Initialize conversation history if needed
             if session_id not in conversation_history:
@@ -270,10 +393,6 @@ async def stream_chat_with_mediblaze(message: ChatMessage):
             # Send initial status
             yield f"data: {json.dumps({'type': 'start', 'status': 'Processing your medical query...'})}\n\n"
             
-            # Show tool indicators during processing
-            yield f"data: {json.dumps({'type': 'tool_start', 'tool_name': 'rag_tool', 'message': '🤔Thinking'})}\n\n"
-            await asyncio.sleep(0.5)  # Simulate search time
-            
             # Build conversation context from history
             messages = []
             # Add previous conversation turns (last 5 exchanges to maintain context)
@@ -284,64 +403,81 @@ async def stream_chat_with_mediblaze(message: ChatMessage):
             # Add current message
             messages.append(HumanMessage(content=message.message))
             
-            # Process with agent including conversation history
-            response = agent.invoke({
-                "messages": messages
-            })
+            # First questions are served from the answer cache when one close enough was answered before
+            history_before = list(conversation_history[session_id])
+            cached = await lookup_cached_answer(message.message, history_before)
+            if cached is not None:
+                yield f"data: {json.dumps({'type': 'response_start'})}\n\n"
+                yield f"data: {json.dumps({'type': 'content', 'content': cached['answer']})}\n\n"
+                remember_turn(session_id, message.message, cached["answer"], list(cached["tools_used"]), datetime.now())
+                yield f"data: {json.dumps({'type': 'complete', 'tools_used': cached['tools_used'], 'cached': True})}\n\n"
+                return
             
-            # Check if web search was used by examining tool calls
             tools_used = []
-            if response and "messages" in response:
-                for msg in response["messages"]:
-                    if hasattr(msg, 'tool_calls') and msg.tool_calls:
-                        for tool_call in msg.tool_calls:
-                            tool_name = tool_call["name"]
-                            if tool_name not in tools_used:
-                                tools_used.append(tool_name)
-                                if "web" in tool_name.lower():
-                                    yield f"data: {json.dumps({'type': 'tool_start', 'tool_name': 'web_search', 'message': 'Searching web for latest medical information...'})}\n\n"
-                                    await asyncio.sleep(1.0)  # Simulate web search time
+            tool_start_times: Dict[str, float] = {}
+            streamed_text = ""
+            response_started = False
+            final_state = None
             
-            # End tool usage
-            yield f"data: {json.dumps({'type': 'tool_end'})}\n\n"
-              # Extract the response
-            if response and "messages" in response:
-                final_message = response["messages"][-1]
-                response_text = final_message.content
-                
-                # Send response start
-                yield f"data: {json.dumps({'type': 'response_start'})}\n\n"
-                
-                # Split response by sentences and meaningful chunks to preserve markdown structure
-                # This ensures headers, lists, and formatting stay intact
-                lines = response_text.split('\n')
-                current_chunk = ""
-                
-                for line in lines:
-                    current_chunk += line + '\n'
+            # Relay graph events as they happen: LLM tokens from llm_call, tool runs from the environment node
+            async with agent_slot():
+                async for event in agent.astream_events({"messages": messages}, version="v2"):
+                    kind = event["event"]
                     
-                    # Send chunk if we have a complete line or it's getting long
-                    if line.strip() == '' or len(current_chunk) > 100 or line.startswith('##') or line.startswith('**') or line.startswith('-'):
-                        if current_chunk.strip():
-                            yield f"data: {json.dumps({'type': 'content', 'content': current_chunk.strip()})}\n\n"
-                            await asyncio.sleep(0.1)  # Slightly longer delay for readability
-                        current_chunk = ""
-                
-                # Send any remaining content
-                if current_chunk.strip():
-                    yield f"data: {json.dumps({'type': 'content', 'content': current_chunk.strip()})}\n\n"
+                    if kind == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "llm_call":
+                        token = event["data"]["chunk"].content
+                        if not token:
+                            continue
+                        if not response_started:
+                            response_started = True
+                            yield f"data: {json.dumps({'type': 'response_start'})}\n\n"
+                        streamed_text += token
+                        yield f"data: {json.dumps({'type': 'content', 'content': token})}\n\n"
+                    
+                    elif kind == "on_chat_model_end" and event["metadata"].get("langgraph_node") == "llm_call":
+                        output = event["data"].get("output")
+                        if getattr(output, "tool_calls", None) and response_started:
+                            # Text from a tool-calling turn is not part of the answer - clear it from the UI
+                            response_started = False
+                            streamed_text = ""
+                            yield f"data: {json.dumps({'type': 'response_reset'})}\n\n"
+                    
+                    elif kind == "on_tool_start":
+                        tool_name = event["name"]
+                        tool_start_times[event["run_id"]] = time.perf_counter()
+                        if tool_name not in tools_used:
+                            tools_used.append(tool_name)
+                        status = TOOL_STATUS_MESSAGES.get(tool_name, f"Running {tool_name}...")
+                        yield f"data: {json.dumps({'type': 'tool_start', 'tool_name': tool_name, 'message': status})}\n\n"
+                    
+                    elif kind in ("on_tool_end", "on_tool_error"):
+                        started = tool_start_times.pop(event["run_id"], None)
+                        duration_ms = round((time.perf_counter() - started) * 1000, 1) if started else None
+                        # active_tools: parallel tool runs still going; the UI keeps its indicator until it is 0
+                        yield f"data: {json.dumps({'type': 'tool_end', 'tool_name': event['name'], 'duration_ms': duration_ms, 'active_tools': len(tool_start_times)})}\n\n"
+                    
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        # Root graph run finished - keep its final state
+                        final_state = event["data"].get("output")
+            
+            # Extract the response
+            if final_state and final_state.get("messages"):
+                response_text = final_state["messages"][-1].content
+            else:
+                response_text = streamed_text
+            
+            if response_text:
+                # Model produced no streamable tokens (e.g. provider without streaming) - send it whole
+                if not response_started:
+                    yield f"data: {json.dumps({'type': 'response_start'})}\n\n"
+                    yield f"data: {json.dumps({'type': 'content', 'content': response_text})}\n\n"
                 
                 # Store in conversation history for context in follow-up questions
-                conversation_history[session_id].append({
-                    "user_message": message.message,
-                    "bot_response": response_text,
-                    "timestamp": datetime.now(),
-                    "tools_used": tools_used
-                })
+                remember_turn(session_id, message.message, response_text, tools_used, datetime.now())
                 
-                # Limit conversation history (keep last 10 exchanges)
-                if len(conversation_history[session_id]) > 10:
-                    conversation_history[session_id] = conversation_history[session_id][-10:]
+                # Only a completed graph run shows whether a tool failed, so partial streams are not cached
+                if final_state and final_state.get("messages"):
+                    await store_cached_answer(message.message, history_before, response_text, tools_used, final_state["messages"])
                 
                 # Send completion
                 yield f"data: {json.dumps({'type': 'complete', 'tools_used': tools_used})}\n\n"
@@ -6,7 +6,8 @@ import os
 from dotenv import load_dotenv
 from pinecone.grpc import PineconeGRPC as Pinecone
 from pinecone import ServerlessSpec
-import time
+
+from src.index_provisioning import IndexNotReadyError, wait_for_index_ready
 
 # Load environment variables
 load_dotenv()
@@ -68,17 +69,17 @@ try:
             )
         )
         
-        print("⏳ Waiting for index to be ready (this may take 30-60 seconds)...")
-        time.sleep(45)
+        print("⏳ Waiting for index to be ready...")
         
-        # Verify index is ready
-        if index_name in [idx.name for idx in pc.list_indexes()]:
-            print(f"✅ Index '{index_name}' created successfully!")
+        # Poll the index status instead of guessing how long provisioning takes
+        try:
+            elapsed = wait_for_index_ready(pc, index_name)
+            print(f"✅ Index '{index_name}' created successfully! (ready after {elapsed:.1f}s)")
             print()
             print("📚 Next step: Upload your medical documents")
             print("💡 Run: python src/rag_upload.py")
-        else:
-            print("⚠️  Index creation may still be in progress. Check Pinecone dashboard.")
+        except IndexNotReadyError as e:
+            print(f"⚠️  {e}. Index creation may still be in progress. Check Pinecone dashboard.")
     
     print()
     print("=" * 70)
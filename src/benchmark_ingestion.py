@@ -0,0 +1,133 @@
+"""
+⏱️ Benchmarks for the MediBlaze ingestion pipeline.
+
+Usage:
+    python src/benchmark_ingestion.py pdf --workers 1 2 4 8
+    python src/benchmark_ingestion.py pipeline --embed-latency-ms 200 --embed-concurrency 1 4 8
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+# Make the project packages importable when run as `python src/benchmark_ingestion.py`
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.pdf_extract import PAGES_PER_SHARD, load_pdfs_parallel
+
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, "Data")
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def benchmark_pdf(data_dir, worker_counts, pages_per_shard):
+    """Pages/second of the serial PyPDFLoader baseline versus sharded process-pool extraction."""
+    from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
+
+    files = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(data_dir) for name in names if name.lower().endswith(".pdf")
+    )
+    print(f"📂 {len(files)} PDF file(s) in {data_dir}, CPUs available: {os.cpu_count()}")
+
+    baseline, elapsed = timed(lambda: DirectoryLoader(data_dir, glob="**/*.pdf", loader_cls=PyPDFLoader).load())
+    baseline_rate = len(baseline) / elapsed
+    print(f"{'serial PyPDFLoader':<28} {len(baseline):>6} pages {elapsed:>8.2f}s {baseline_rate:>9.1f} pages/s")
+
+    baseline_text = {(os.path.normpath(d.metadata["source"]), d.metadata["page"]): d.page_content for d in baseline}
+    for workers in worker_counts:
+        pages, elapsed = timed(lambda: load_pdfs_parallel(files, workers=workers, pages_per_shard=pages_per_shard))
+        rate = len(pages) / elapsed
+        mismatched = sum(
+            baseline_text.get((os.path.normpath(d.metadata["source"]), d.metadata["page"])) != d.page_content
+            for d in pages
+        )
+        print(f"{f'process pool, {workers} worker(s)':<28} {len(pages):>6} pages {elapsed:>8.2f}s {rate:>9.1f} pages/s"
+              f"  x{rate / baseline_rate:.2f}  ({mismatched} pages differ from baseline)")
+
+
+class SlowEmbeddings:
+    """Offline stand-in for the embedding API: hashing embeddings plus a fixed per-request latency."""
+
+    def __init__(self, base, latency_seconds):
+        self.base = base
+        self.latency_seconds = latency_seconds
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency_seconds)
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        time.sleep(self.latency_seconds)
+        return self.base.embed_query(text)
+
+
+def benchmark_pipeline(paths, embed_concurrencies, workers, batch_size, embed_latency_ms):
+    """
+    End-to-end ingest() runs against local stand-ins - hashing embeddings with simulated
+    request latency and the local index in a scratch directory - reporting busy time per stage.
+    """
+    from agent.utils.local_index import HashingEmbeddings
+    from src.rag_upload import IngestOptions, ingest
+
+    embeddings = SlowEmbeddings(HashingEmbeddings(), embed_latency_ms / 1000)
+    results = []
+    for concurrency in embed_concurrencies:
+        with tempfile.TemporaryDirectory() as scratch:
+            options = IngestOptions(
+                backend="local",
+                workers=workers,
+                batch_size=batch_size,
+                embed_concurrency=concurrency,
+                embeddings=embeddings,
+                embedding_provider="hashing",
+                embedding_store_dir="",  # Embed every chunk on every run
+                manifest_dir=os.path.join(scratch, "ingestion"),
+                local_index_dir=os.path.join(scratch, "local_index"),
+                registry_path=os.path.join(scratch, "index_registry.json"),
+            )
+            results.append((concurrency, ingest(paths, options=options)))
+
+    stages = sorted({stage for _, report in results for stage in report.get("stage_seconds", {})})
+    print()
+    print(f"{'embed concurrency':<18} {'chunks':>7} {'wall s':>8} {'chunks/s':>9} {'peak MB':>8}  "
+          + " ".join(f"{stage + ' s':>12}" for stage in stages))
+    for concurrency, report in results:
+        elapsed = report.get("elapsed_seconds", 0.0)
+        print(f"{concurrency:<18} {report.get('chunks', 0):>7} {elapsed:>8.2f} "
+              f"{report.get('chunks', 0) / max(elapsed, 1e-9):>9.1f} {report.get('peak_rss_mb', 0.0):>8.0f}  "
+              + " ".join(f"{report['stage_seconds'].get(stage, 0.0):>12.2f}" for stage in stages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MediBlaze ingestion stages")
+    subparsers = parser.add_subparsers(dest="stage", required=True)
+
+    pdf = subparsers.add_parser("pdf", help="PDF page extraction throughput")
+    pdf.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    pdf.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    pdf.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD)
+
+    pipeline = subparsers.add_parser("pipeline", help="End-to-end ingestion with local stand-ins")
+    pipeline.add_argument("paths", nargs="*", default=[DEFAULT_DATA_DIR])
+    pipeline.add_argument("--embed-concurrency", type=int, nargs="+", default=[1, 4])
+    pipeline.add_argument("--embed-latency-ms", type=float, default=0.0, help="Simulated embedding request latency")
+    pipeline.add_argument("--workers", type=int, default=None)
+    pipeline.add_argument("--batch-size", type=int, default=100)
+
+    args = parser.parse_args()
+    if args.stage == "pdf":
+        benchmark_pdf(args.data_dir, sorted(set(args.workers)), args.pages_per_shard)
+    elif args.stage == "pipeline":
+        benchmark_pipeline(args.paths, args.embed_concurrency, args.workers, args.batch_size, args.embed_latency_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+⏱️ Retrieval benchmark for the MediBlaze knowledge base: dense vs BM25 vs hybrid (RRF) vs MMR.
+Queries are the user turns in test_cases/. The test cases carry no relevance labels, so
+recall is measured as query-term recall@k: the share of a query's content terms (drug
+names, abbreviations, symptoms) that appear anywhere in the top-k chunks. Redundancy is
+the mean pairwise cosine similarity of the top-k chunks (lower = more distinct content).
+
+Usage:
+    python src/benchmark_retrieval.py [paths ...] [--k 7] [--embeddings hashing|pinecone]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+# Make the project packages importable when run as `python src/benchmark_retrieval.py`
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from agent.utils.retrieval import EMBEDDING_MODEL, HYBRID_CANDIDATES, RAG_TOP_K, hybrid_search, mmr_search
+from agent.utils.sparse_index import tokenize
+from agent.utils.vector_backends import LocalBackend, create_embeddings
+
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, "Data")
+TEST_CASES_DIR = os.path.join(PROJECT_ROOT, "test_cases")
+BENCHMARK_INDEX = "benchmark"
+
+
+def load_queries(directory=TEST_CASES_DIR):
+    """User turns of TEST_CASES.json plus the "message" of every other test case file."""
+    queries = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if "message" in data:
+            queries.append(data["message"])
+        for case in data.get("test_cases", []):
+            queries.extend(turn["user"] for turn in case.get("conversation", []) if turn.get("user"))
+    return list(dict.fromkeys(query for query in queries if tokenize(query)))
+
+
+def term_recall(query, docs):
+    terms = set(tokenize(query))
+    found = set(tokenize(" ".join(doc.page_content for doc in docs)))
+    return len(terms & found) / len(terms)
+
+
+def redundancy(docs, embeddings):
+    if len(docs) < 2:
+        return 0.0
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in docs]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    return float(similarity[np.triu_indices(len(docs), 1)].mean())
+
+
+class _FixedQueryEmbeddings:
+    """Serves precomputed query vectors to the backend."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+def benchmark_retrieval(paths, k, embeddings_provider, candidates, repeat):
+    """Ingest `paths` into a scratch local index, then time every mode on the test case queries."""
+    from src.rag_upload import IngestOptions, ingest
+
+    queries = load_queries()
+    embeddings = create_embeddings(EMBEDDING_MODEL, embeddings_provider)
+    with tempfile.TemporaryDirectory() as scratch:
+        options = IngestOptions(
+            backend="local",
+            embeddings=embeddings,
+            embedding_provider=embeddings_provider,
+            manifest_dir=os.path.join(scratch, "ingestion"),
+            local_index_dir=os.path.join(scratch, "local_index"),
+            registry_path=os.path.join(scratch, "index_registry.json"),
+            embedding_store_dir=os.path.join(scratch, "embedding_store"),
+        )
+        report = ingest(paths, BENCHMARK_INDEX, options)
+        backend = LocalBackend(embeddings, root=options.local_index_dir)
+        version = report["version"]
+        backend.warm_up(BENCHMARK_INDEX, version=version)
+        # Query embeddings are computed once up front so dense latency is the index search alone;
+        # embed_query keeps the model's query input type (e5 embeds queries and passages differently)
+        vectors = {query: embeddings.embed_query(query) for query in queries}
+        backend.embeddings = _FixedQueryEmbeddings(vectors)
+
+        modes = {
+            "dense": lambda q: backend.similarity_search(q, k, BENCHMARK_INDEX, version=version),
+            "bm25": lambda q: backend.sparse_search(q, k, BENCHMARK_INDEX, version=version),
+            "hybrid": lambda q: hybrid_search(backend, q, k, BENCHMARK_INDEX, version=version, candidates=candidates),
+            "mmr": lambda q: mmr_search(backend, q, k, BENCHMARK_INDEX, version=version),
+        }
+        print(f"\n🔎 {len(queries)} queries from {TEST_CASES_DIR}, {report.get('chunks', 0)} chunks, k={k}, "
+              f"{embeddings_provider} embeddings")
+        print(f"{'mode':<8} {'term recall@k':>14} {'redundancy':>11} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode, search in modes.items():
+            recalls, redundancies, latencies = [], [], []
+            for query in queries:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    docs = search(query)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(term_recall(query, docs))
+                redundancies.append(redundancy(docs, embeddings))
+            print(f"{mode:<8} {np.mean(recalls):>14.3f} {np.mean(redundancies):>11.3f} {np.percentile(latencies, 50):>8.2f} "
+                  f"{np.percentile(latencies, 95):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MediBlaze dense, BM25, hybrid and MMR retrieval")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_DATA_DIR])
+    parser.add_argument("--k", type=int, default=RAG_TOP_K)
+    parser.add_argument("--embeddings", choices=["pinecone", "hashing"], default="hashing")
+    parser.add_argument("--candidates", type=int, default=HYBRID_CANDIDATES, help="Per-ranking candidates before fusion")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    args = parser.parse_args()
+    benchmark_retrieval(args.paths, args.k, args.embeddings, args.candidates, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+✂️ Chunking for src/rag_upload.py.
+Chunks are sized either in characters (the original 500-character splitter) or in tokens
+(tiktoken, packed to a target token count), and every run reports the chunk-size
+distribution plus what a rag_tool call costs in prompt tokens.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from agent.utils.compression import COMPRESSION_ENABLED, CONTEXT_TOKEN_BUDGET
+from agent.utils.tokens import TOKEN_ENCODING, count_tokens, token_counter
+
+# "characters" (default, 500 chars / 20 overlap) or "tokens" (tiktoken-budgeted chunks)
+CHUNK_MODE = os.getenv("INGEST_CHUNK_MODE", "characters")
+CHUNK_SIZE_CHARS = 500
+CHUNK_OVERLAP_CHARS = 20
+# Token mode: target chunk size / overlap, counted with the chat model's encoding
+CHUNK_SIZE_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("INGEST_CHUNK_OVERLAP_TOKENS", "32"))
+
+
+def make_text_splitter(mode: str = CHUNK_MODE) -> RecursiveCharacterTextSplitter:
+    """Splitter for the configured mode; add_start_index feeds the chunk ID."""
+    if mode == "tokens":
+        return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=TOKEN_ENCODING,
+            chunk_size=CHUNK_SIZE_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS,
+            add_start_index=True,
+        )
+    if mode == "characters":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE_CHARS,
+            chunk_overlap=CHUNK_OVERLAP_CHARS,
+            add_start_index=True,  # Offset of the chunk within its page, part of the chunk ID
+        )
+    raise ValueError(f"Unknown INGEST_CHUNK_MODE: {mode}")
+
+
+class ChunkSizeReport:
+    """Collects the token size of every chunk produced by a run."""
+
+    def __init__(self):
+        self.tokens: List[int] = []
+
+    def add(self, text: str) -> None:
+        self.tokens.append(count_tokens(text))
+
+    def summary(self) -> Dict:
+        if not self.tokens:
+            return {"chunks": 0}
+        sizes = np.asarray(self.tokens)
+        return {
+            "chunks": int(sizes.size),
+            "mean": float(sizes.mean()),
+            "min": int(sizes.min()),
+            "p50": float(np.percentile(sizes, 50)),
+            "p90": float(np.percentile(sizes, 90)),
+            "p99": float(np.percentile(sizes, 99)),
+            "max": int(sizes.max()),
+            "estimated": token_counter() is None,
+        }
+
+    def prompt_cost(self, k: int, header: str = "",
+                    token_budget: Optional[int] = CONTEXT_TOKEN_BUDGET if COMPRESSION_ENABLED else None) -> Dict[str, float]:
+        """
+        Prompt tokens one rag_tool call adds: k chunks joined by blank lines plus the header.
+        With compression on, the knowledge base text is capped at `token_budget` (RAG_CONTEXT_TOKEN_BUDGET).
+        """
+        if not self.tokens:
+            return {"mean": 0.0, "p90": 0.0}
+        sizes = np.asarray(self.tokens)
+        separators = (k - 1) * count_tokens("\n\n")
+
+        def cost(chunk_tokens: float) -> float:
+            context = k * chunk_tokens + separators
+            if token_budget is not None:
+                context = min(context, token_budget)
+            return float(context + count_tokens(header))
+
+        return {"mean": cost(sizes.mean()), "p90": cost(np.percentile(sizes, 90))}
+
+    def format(self, k: int, header: str = "", bins: int = 8) -> str:
+        stats = self.summary()
+        if not stats["chunks"]:
+            return "📏 No chunks produced"
+        unit = "tokens (estimated as chars/4)" if stats["estimated"] else f"tokens ({TOKEN_ENCODING})"
+        lines = [
+            f"📏 Chunk sizes in {unit}: mean {stats['mean']:.0f}, min {stats['min']}, p50 {stats['p50']:.0f}, "
+            f"p90 {stats['p90']:.0f}, p99 {stats['p99']:.0f}, max {stats['max']}"
+        ]
+        counts, edges = np.histogram(self.tokens, bins=bins)
+        widest = max(counts.max(), 1)
+        for count, low, high in zip(counts, edges[:-1], edges[1:]):
+            lines.append(f"   {low:>6.0f}-{high:<6.0f} {'█' * int(round(30 * count / widest)):<30} {count}")
+        cost = self.prompt_cost(k, header)
+        capped = f", compressed to at most {CONTEXT_TOKEN_BUDGET}" if COMPRESSION_ENABLED else ""
+        lines.append(f"💬 rag_tool prompt cost (k={k}{capped}): ~{cost['mean']:.0f} tokens on average, "
+                     f"~{cost['p90']:.0f} at p90")
+        return "\n".join(lines)
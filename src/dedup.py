@@ -0,0 +1,95 @@
+"""
+🧹 Duplicate chunk elimination for src/rag_upload.py.
+Runs between splitting and embedding: exact duplicates are caught by a hash of the normalised
+text, near-duplicates (repeated headers, footers, boilerplate with small variations) by
+MinHash signatures over word shingles, bucketed with LSH banding.
+"""
+import os
+import re
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from agent.utils.cache import normalize_query
+
+# Drop chunks that repeat earlier ones; near-duplicates are chunks whose estimated
+# word-shingle Jaccard similarity with a kept chunk reaches the threshold
+DEDUP_ENABLED = os.getenv("INGEST_DEDUP", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.85"))
+MINHASH_PERMUTATIONS = int(os.getenv("INGEST_MINHASH_PERMUTATIONS", "64"))
+MINHASH_BANDS = 16
+SHINGLE_WORDS = 3
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """Hashes (uint64 below 2^31) of the overlapping word n-grams of a text."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [" ".join(words)] if words else [""]
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    hashes = [int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little") for gram in grams]
+    return np.fromiter((h % _MERSENNE_PRIME for h in hashes), dtype=np.uint64, count=len(hashes))
+
+
+class ChunkDeduplicator:
+    """Stateful filter: is_duplicate() remembers every chunk it lets through."""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = MINHASH_PERMUTATIONS,
+                 bands: int = MINHASH_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._exact: set = set()
+        self._signatures: List[np.ndarray] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+        self.seen = 0
+        self.exact_dropped = 0
+        self.near_dropped = 0
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature: per permutation, the minimum of (a * x + b) mod p over the shingles."""
+        values = (self._a * shingles(text)[None, :] + self._b) % _MERSENNE_PRIME
+        return values.min(axis=1).astype(np.uint32)
+
+    def is_duplicate(self, text: str) -> bool:
+        self.seen += 1
+        digest = hashlib.sha256(normalize_query(text).encode("utf-8")).digest()
+        if digest in self._exact:
+            self.exact_dropped += 1
+            return True
+
+        signature = self.signature(text)
+        bands = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        candidates = {candidate for key in bands for candidate in self._buckets.get(key, ())}
+        for candidate in candidates:
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                self.near_dropped += 1
+                return True
+
+        self._exact.add(digest)
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for key in bands:
+            self._buckets[key].append(position)
+        return False
+
+    def stats(self) -> Dict:
+        dropped = self.exact_dropped + self.near_dropped
+        return {
+            "seen": self.seen,
+            "kept": self.seen - dropped,
+            "exact_dropped": self.exact_dropped,
+            "near_dropped": self.near_dropped,
+            "dropped_ratio": dropped / self.seen if self.seen else 0.0,
+        }
@@ -0,0 +1,78 @@
+"""
+🏗️ Pinecone index provisioning shared by setup_pinecone.py and src/rag_upload.py.
+Instead of sleeping a fixed time after create_index, describe_index is polled with
+exponential backoff until the index reports ready, and the real wait is reported.
+"""
+import os
+import time
+from typing import Callable, Tuple
+
+# Give up on an index that is still not ready after this many seconds
+INDEX_READY_TIMEOUT = float(os.getenv("PINECONE_INDEX_READY_TIMEOUT", "300"))
+# describe_index polling interval: starts small, doubles up to the cap
+INDEX_POLL_INITIAL_DELAY = float(os.getenv("PINECONE_INDEX_POLL_INITIAL_DELAY", "1"))
+INDEX_POLL_MAX_DELAY = float(os.getenv("PINECONE_INDEX_POLL_MAX_DELAY", "10"))
+
+
+class IndexNotReadyError(TimeoutError):
+    """The index did not become ready within the timeout."""
+
+
+def _field(obj, name):
+    """Read a field from a Pinecone model object or a plain dict."""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    value = getattr(obj, name, None)
+    if value is None:
+        try:
+            value = obj[name]
+        except (KeyError, TypeError):
+            value = None
+    return value
+
+
+def index_status(pc, index_name: str) -> Tuple[bool, str]:
+    """(ready, state) of an index as reported by describe_index."""
+    status = _field(pc.describe_index(index_name), "status") or {}
+    return bool(_field(status, "ready")), str(_field(status, "state") or "Unknown")
+
+
+def wait_for_index_ready(pc, index_name: str, timeout: float = INDEX_READY_TIMEOUT,
+                         initial_delay: float = INDEX_POLL_INITIAL_DELAY, max_delay: float = INDEX_POLL_MAX_DELAY,
+                         sleep: Callable[[float], None] = time.sleep) -> float:
+    """Poll describe_index until the index is ready; returns the seconds waited."""
+    started = time.monotonic()
+    delay = initial_delay
+    while True:
+        ready, state = index_status(pc, index_name)
+        elapsed = time.monotonic() - started
+        if ready:
+            return elapsed
+        if elapsed >= timeout:
+            raise IndexNotReadyError(f"Index '{index_name}' not ready after {elapsed:.0f}s (state: {state})")
+        print(f"⏳ Index '{index_name}' is {state}, checking again in {delay:.0f}s...")
+        sleep(min(delay, max(timeout - elapsed, 0)))
+        delay = min(delay * 2, max_delay)
+
+
+def ensure_index(pc, index_name: str, dimension: int, metric: str = "cosine", cloud: str = "aws",
+                 region: str = "us-east-1", timeout: float = INDEX_READY_TIMEOUT) -> bool:
+    """
+    Create the serverless index if it does not exist and wait until it is ready.
+    Returns True when the index was created by this call.
+    """
+    from pinecone import ServerlessSpec
+
+    created = index_name not in [index.name for index in pc.list_indexes()]
+    if created:
+        print(f"🔨 Creating index {index_name}...")
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric=metric,
+            spec=ServerlessSpec(cloud=cloud, region=region)
+        )
+    elapsed = wait_for_index_ready(pc, index_name, timeout=timeout)
+    if created:
+        print(f"✅ Index '{index_name}' ready after {elapsed:.1f}s")
+    return created
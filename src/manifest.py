@@ -0,0 +1,110 @@
+"""
+📒 Ingestion manifest for src/rag_upload.py.
+Records which chunk IDs have been written to an index (so an interrupted upload resumes
+where it stopped) and, per source file, its content hash and chunk IDs (so re-ingestion
+only touches files that changed).
+"""
+import os
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+
+class IngestionManifest:
+    """JSON checkpoint file, rewritten atomically after every successful batch."""
+
+    def __init__(self, path: str, index_name: str, namespace: str = ""):
+        self.path = path
+        self.index_name = index_name
+        self.namespace = namespace
+        self.data: Dict = self._load()
+
+    def _empty(self) -> Dict:
+        return {
+            "index_name": self.index_name,
+            "namespace": self.namespace,
+            "updated_at": None,
+            "chunks": {},
+            "files": {},
+        }
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return self._empty()
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("index_name") != self.index_name or data.get("namespace", "") != self.namespace:
+            # Manifest belongs to another index - start over rather than trust it
+            return self._empty()
+        data.setdefault("chunks", {})
+        data.setdefault("files", {})
+        return data
+
+    @staticmethod
+    def peek(path: str) -> Optional[Dict]:
+        """Raw contents of a manifest file without validating it, or None when there is none."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def chunks(self) -> Dict[str, Dict]:
+        """Chunk ID -> metadata for every chunk already written to the index."""
+        return self.data["chunks"]
+
+    def is_done(self, chunk_id: str) -> bool:
+        return chunk_id in self.data["chunks"]
+
+    def mark_done(self, chunk_ids: Iterable[str], metadata: Optional[Iterable[Dict]] = None) -> None:
+        """Record a successfully written batch and checkpoint immediately."""
+        chunk_ids = list(chunk_ids)
+        metadata = list(metadata) if metadata is not None else [{} for _ in chunk_ids]
+        for chunk_id, meta in zip(chunk_ids, metadata):
+            self.data["chunks"][chunk_id] = meta
+        self.save()
+
+    def forget_chunks(self, chunk_ids: Iterable[str]) -> None:
+        """Drop chunks that were deleted from the index."""
+        for chunk_id in chunk_ids:
+            self.data["chunks"].pop(chunk_id, None)
+        self.save()
+
+    @property
+    def files(self) -> Dict[str, Dict]:
+        """Source file (relative path) -> {"sha256": ..., "chunk_ids": [...], "chunk_schema": ...} of ingested files."""
+        return self.data["files"]
+
+    def set_file(self, relative_path: str, sha256: str, chunk_ids: List[str], chunk_schema: int = 1) -> None:
+        """Record that every chunk of this version of the file is in the index."""
+        self.data["files"][relative_path] = {"sha256": sha256, "chunk_ids": list(chunk_ids), "chunk_schema": chunk_schema}
+        self.save()
+
+    def remove_file(self, relative_path: str) -> None:
+        self.data["files"].pop(relative_path, None)
+        self.save()
+
+    def reset(self) -> None:
+        self.data = self._empty()
+        self.save()
+
+    def delete(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def promote_to(self, path: str) -> None:
+        """Atomically make this manifest the one stored at `path` (and keep using it there)."""
+        self.save()
+        os.replace(self.path, path)
+        self.path = path
+
+    def save(self) -> None:
+        self.data["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,89 @@
+"""
+📄 Parallel PDF text extraction for src/rag_upload.py.
+Each PDF is split into page ranges that are parsed by a ProcessPoolExecutor; pages are
+yielded back in (file, page) order with the same metadata PyPDFLoader produces.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+# Worker processes for page extraction (defaults to one per CPU)
+PDF_WORKERS = int(os.getenv("INGEST_PDF_WORKERS", "0")) or (os.cpu_count() or 1)
+# Pages parsed per task; small enough to balance load, large enough to amortise opening the file
+PAGES_PER_SHARD = int(os.getenv("INGEST_PAGES_PER_SHARD", "32"))
+
+
+# Per-process cache of the last opened reader: consecutive shards of one file skip re-parsing its xref
+_open_reader: dict = {}
+
+
+def _reader(path: str):
+    from pypdf import PdfReader
+    key = (path, os.path.getmtime(path))
+    if key not in _open_reader:
+        _open_reader.clear()
+        _open_reader[key] = PdfReader(path)
+    return _open_reader[key]
+
+
+def count_pages(path: str) -> int:
+    return len(_reader(path).pages)
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[Tuple[int, str, str]]:
+    """Worker: (page number, page label, text) for pages [start, stop) of one PDF."""
+    reader = _reader(path)
+    labels = reader.page_labels
+    return [(number, labels[number], reader.pages[number].extract_text().strip()) for number in range(start, stop)]
+
+
+def _extract_shard(task: Tuple[str, int, int]) -> List[Tuple[int, str, str]]:
+    return extract_page_range(*task)
+
+
+def page_shards(files: Iterable[str], pages_per_shard: int = PAGES_PER_SHARD) -> Iterator[Tuple[str, int, int, int]]:
+    """(path, start, stop, total_pages) tasks covering every page of every file, in order."""
+    for path in files:
+        total_pages = count_pages(path)
+        for start in range(0, total_pages, pages_per_shard):
+            yield path, start, min(start + pages_per_shard, total_pages), total_pages
+
+
+def iter_pdf_pages(files: Iterable[str], workers: Optional[int] = None,
+                   pages_per_shard: int = PAGES_PER_SHARD) -> Iterator[Document]:
+    """
+    Yield one Document per PDF page, in file and page order.
+    At most 2 x workers shards are in flight, so memory stays bounded for large corpora.
+    """
+    workers = workers or PDF_WORKERS
+    shards = page_shards(files, pages_per_shard)
+
+    def to_documents(shard, pages):
+        path, _, _, total_pages = shard
+        for number, label, text in pages:
+            yield Document(
+                page_content=text,
+                metadata={"source": path, "total_pages": total_pages, "page": number, "page_label": label}
+            )
+
+    if workers <= 1:
+        for shard in shards:
+            yield from to_documents(shard, extract_page_range(*shard[:3]))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = []
+        for shard in shards:
+            in_flight.append((shard, executor.submit(_extract_shard, shard[:3])))
+            if len(in_flight) >= workers * 2:
+                done_shard, future = in_flight.pop(0)
+                yield from to_documents(done_shard, future.result())
+        for done_shard, future in in_flight:
+            yield from to_documents(done_shard, future.result())
+
+
+def load_pdfs_parallel(files: Iterable[str], workers: Optional[int] = None,
+                       pages_per_shard: int = PAGES_PER_SHARD) -> List[Document]:
+    return list(iter_pdf_pages(files, workers, pages_per_shard))
@@ -0,0 +1,181 @@
+"""
+🔀 Streaming helpers for the ingestion pipeline in src/rag_upload.py.
+Stages are plain generators; `threaded` runs one in a background thread behind a bounded
+queue, so parsing, embedding and upserting overlap while memory use stays flat.
+"""
+import sys
+import time
+import queue
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_END = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def threaded(items: Iterable[T], maxsize: int, name: str = "stage") -> Iterator[T]:
+    """
+    Iterate `items` in a background thread, handing results over through a queue of at most
+    `maxsize` entries. The producer blocks while the queue is full (back-pressure), its
+    exceptions are re-raised in the consumer, and closing the consumer stops the producer.
+    """
+    handoff: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            # Close the upstream generator here so its own cleanup (pools, threads) runs in this thread
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()
+
+    worker = threading.Thread(target=produce, name=f"ingest-{name}", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group a stream into lists of `size` items (the last one may be shorter)."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batched_by_size(items: Iterable[T], max_items: int, max_bytes: int,
+                    size_of: Callable[[T], int]) -> Iterator[List[T]]:
+    """
+    Group a stream into lists of at most `max_items` items whose estimated payload stays
+    below `max_bytes`; a single item larger than the limit becomes a batch of its own.
+    """
+    batch: List[T] = []
+    batch_bytes = 0
+    for item in items:
+        item_bytes = size_of(item)
+        if batch and (len(batch) >= max_items or batch_bytes + item_bytes > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(item)
+        batch_bytes += item_bytes
+    if batch:
+        yield batch
+
+
+def parallel_map(fn: Callable[[T], R], items: Iterable[T], workers: int, name: str = "stage") -> Iterator[R]:
+    """
+    fn(item) for every item on a thread pool with at most `workers` calls in flight;
+    results are yielded in input order and the first failure is re-raised.
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"ingest-{name}") as executor:
+        in_flight = deque()
+        try:
+            for item in items:
+                in_flight.append(executor.submit(fn, item))
+                if len(in_flight) >= workers:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+class StageTimer:
+    """
+    Busy time per pipeline stage, summed over every thread working on it. Stages overlap,
+    so the totals show where the work goes rather than adding up to the wall-clock time.
+    """
+
+    def __init__(self):
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[stage] += seconds
+
+    @contextmanager
+    def measure(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def timed(self, items: Iterable[T], stage: str) -> Iterator[T]:
+        """Re-yield `items`, charging the time spent producing each one to `stage`."""
+        iterator = iter(items)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add(stage, time.perf_counter() - started)
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._seconds)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (0 where the platform can't tell)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
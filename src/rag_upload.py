@@ -1,5 +1,53 @@
+"""
+📤 MediBlaze knowledge base ingestion.
+Parses PDFs, splits, deduplicates and embeds them, and writes the chunks to Pinecone or the
+local index. Use it as a library - ingest(paths, index, options) - or from the command line:
+
+    python src/rag_upload.py [paths ...] [--backend local] [--workers 4] [--batch-size 100] [--dry-run]
+"""
 import os
+import sys
+import glob
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+import numpy as np
 from dotenv import load_dotenv
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# Make the project packages (agent.utils) importable when run as `python src/rag_upload.py`
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from agent.utils.cache import TTLCache
+from agent.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from agent.utils.index_registry import (
+    REGISTRY_PATH, STATE_DIR, IndexRegistry, forget_retired_version, new_version_id, publish_index_version,
+    read_pinecone_alias, retired_index_versions, write_pinecone_alias
+)
+from agent.utils.local_index import LocalIndexWriter, LocalVectorIndex, resolve_local_index_path
+from agent.utils.sparse_index import SparseIndexWriter
+from agent.utils.vector_backends import (
+    EMBEDDING_PROVIDER, VECTOR_BACKEND, LOCAL_INDEX_DIR, SPARSE_INDEX_DIR, create_embeddings
+)
+from agent.utils.retrieval import RAG_RESULT_HEADER, RAG_TOP_K
+from src.chunking import CHUNK_MODE, ChunkSizeReport, make_text_splitter
+from src.dedup import DEDUP_ENABLED, ChunkDeduplicator
+from src.index_provisioning import ensure_index
+from src.manifest import IngestionManifest
+from src.pdf_extract import PDF_WORKERS, iter_pdf_pages, load_pdfs_parallel
+from src.pipeline import StageTimer, batched_by_size, parallel_map, peak_rss_mb, threaded
+from src.rate_limit import AdaptivePacer, is_rate_limited, retry_after_seconds
+from src.structure import SectionTracker, annotate_chunks
 
 # Load environment variables from .env file
 load_dotenv()
@@ -7,119 +55,701 @@ load_dotenv()
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 # print(PINECONE_API_KEY)
 
-from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+index_name = "mediblaze-bot"
+embedding_model = "multilingual-e5-large"
+batch_size = 100  # Upload at most 100 chunks at a time
+embedding_dimension = 1024  # Dimension of the embeddings
+# IVF lists for the local index (0 = exhaustive search, fine up to ~100k chunks)
+LOCAL_INDEX_NLIST = int(os.getenv("LOCAL_INDEX_NLIST", "0"))
+# Checkpoint of chunk IDs already upserted, used to resume interrupted uploads
+MANIFEST_DIR = os.path.join(STATE_DIR, "ingestion")
+# Retry policy for failed batches: exponential backoff with jitter, then abort the run
+MAX_BATCH_ATTEMPTS = int(os.getenv("INGEST_MAX_BATCH_ATTEMPTS", "6"))
+RETRY_BASE_DELAY = float(os.getenv("INGEST_RETRY_BASE_DELAY", "2"))
+RETRY_MAX_DELAY = float(os.getenv("INGEST_RETRY_MAX_DELAY", "60"))
+# Bounded hand-off queues between pipeline stages: parsed pages, and embedded batches awaiting upload
+PAGE_QUEUE_SIZE = int(os.getenv("INGEST_PAGE_QUEUE_SIZE", "64"))
+EMBED_QUEUE_SIZE = int(os.getenv("INGEST_EMBED_QUEUE_SIZE", "2"))
+# Chunk embeddings keyed by (model, chunk text hash) survive between runs here; "" disables the store
+EMBEDDING_STORE_DIR = os.getenv("INGEST_EMBEDDING_STORE_DIR", os.path.join(STATE_DIR, "embedding_store"))
+# Embedding and upsert requests kept in flight at once
+EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+UPSERT_CONCURRENCY = int(os.getenv("INGEST_UPSERT_CONCURRENCY", "4"))
+# Batches are also cut by estimated upsert payload size (Pinecone rejects requests over 2 MB)
+MAX_BATCH_BYTES = int(os.getenv("INGEST_MAX_BATCH_BYTES", "1800000"))
+# Metadata key PineconeVectorStore reads the chunk text from
+PINECONE_TEXT_KEY = "text"
+DEFAULT_DATA_DIR = os.path.join(PROJECT_ROOT, "Data")
+# Bump when the chunk metadata changes: files ingested under an older schema get new chunk IDs
+# and are rewritten (embeddings still come from the embedding store). 2: heading/page/content metadata
+CHUNK_SCHEMA_VERSION = 2
+# Replaced index versions stay available this long (for servers still on the old alias) before they are dropped
+INDEX_VERSION_GRACE_SECONDS = float(os.getenv("INDEX_VERSION_GRACE_SECONDS", "3600"))
+
 
+@dataclass
+class IngestOptions:
+    """Settings for one ingest() run; defaults come from the environment."""
 
-def load_pdf_file(data_dir="."):
+    backend: str = VECTOR_BACKEND            # "pinecone" or "local"
+    workers: Optional[int] = None            # PDF extraction processes (None = INGEST_PDF_WORKERS)
+    batch_size: int = batch_size             # Max chunks per embedding / upsert request
+    embed_concurrency: int = EMBED_CONCURRENCY
+    upsert_concurrency: int = UPSERT_CONCURRENCY
+    dry_run: bool = False                    # Parse, split and deduplicate only; nothing is embedded or written
+    dedup: bool = DEDUP_ENABLED
+    embedding_provider: str = EMBEDDING_PROVIDER
+    embeddings: Optional[Embeddings] = None  # Pre-built embedding client (e.g. a stand-in for benchmarks)
+    embedding_store_dir: str = EMBEDDING_STORE_DIR
+    manifest_dir: str = MANIFEST_DIR
+    local_index_dir: str = LOCAL_INDEX_DIR
+    sparse_index_dir: str = SPARSE_INDEX_DIR  # BM25 indexes of Pinecone namespaces
+    registry_path: str = REGISTRY_PATH
+    grace_seconds: float = INDEX_VERSION_GRACE_SECONDS  # How long replaced versions stay readable
+
+
+def resolve_data_path(data_dir="."):
     # Resolve path relative to script location
     script_dir = os.path.dirname(os.path.abspath(__file__))
     data_path = os.path.join(script_dir, data_dir)
     data_path = os.path.normpath(data_path)
-    
+
     if not os.path.exists(data_path):
         raise FileNotFoundError(f"Data directory not found: {data_path}")
-    
+    return data_path
+
+
+def list_pdf_files(data_path):
+    """All PDFs below data_path, in a stable order."""
+    return sorted(glob.glob(os.path.join(data_path, "**", "*.pdf"), recursive=True))
+
+
+def collect_sources(paths):
+    """
+    Map every PDF under `paths` (files or directories) to its manifest key: the path
+    relative to the directory it was found in, or the file name for files given directly.
+    """
+    sources = {}
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            for file in list_pdf_files(path):
+                sources[file] = os.path.relpath(file, path)
+        elif os.path.isfile(path):
+            sources[path] = os.path.basename(path)
+        else:
+            raise FileNotFoundError(f"Data path not found: {path}")
+    return sources
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_pdf_file(data_dir=".", files=None, workers=None):
+    """Load every PDF in data_dir, or only `files` (absolute paths) when given, one Document per page."""
+    data_path = resolve_data_path(data_dir)
+    if files is None:
+        files = list_pdf_files(data_path)
+
     print(f"📂 Loading PDFs from: {data_path}")
-    loader = DirectoryLoader(data_path, glob="**/*.pdf", loader_cls=PyPDFLoader)
-    documents = loader.load()
-    print(f"✅ Loaded {len(documents)} documents")
+    started = time.perf_counter()
+    # Page ranges are parsed in parallel worker processes; results come back in page order
+    documents = load_pdfs_parallel(files, workers=workers)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Loaded {len(documents)} documents in {elapsed:.1f}s ({len(documents) / max(elapsed, 1e-9):.1f} pages/s)")
     return documents
 
-extracted_data = load_pdf_file("../Data")
-
 #CHunking
 def text_split(extracted_data):
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=500,
-        chunk_overlap=20,
-    )
+    text_splitter = make_text_splitter()
     text_chunks = text_splitter.split_documents(extracted_data)
     return text_chunks
 
-text_chunks = text_split(extracted_data)
-print(f"📝 Created {len(text_chunks)} text chunks")
 
-from langchain_pinecone import PineconeEmbeddings
-# Initialize Pinecone embeddings model
-embeddings = PineconeEmbeddings(model="multilingual-e5-large")
-print("🔧 Initialized Pinecone embeddings model")
+def chunk_id(file_hash, page, offset, text):
+    """Content-derived chunk ID: identical input always maps to the same vector ID."""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = f"{file_hash}:{page}:{offset}:{text_hash}:{CHUNK_SCHEMA_VERSION}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
 
-from pinecone.grpc import PineconeGRPC as Pinecone
-from pinecone import ServerlessSpec
-from langchain_pinecone import PineconeVectorStore
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index_name = "mediblaze-bot"
+def assign_chunk_ids(text_chunks, file_hashes):
+    """Set chunk.id from (source file hash, page, chunk offset, chunk text hash)."""
+    for chunk in text_chunks:
+        source = chunk.metadata.get("source", "")
+        file_hash = file_hashes.get(source) or file_sha256(source)
+        chunk.id = chunk_id(file_hash, chunk.metadata.get("page", 0), chunk.metadata.get("start_index", 0), chunk.page_content)
+    return text_chunks
 
-# Check if index exists, if not create it
-import time
-existing_indexes = [index.name for index in pc.list_indexes()]
-if index_name not in existing_indexes:
-    print(f"Creating index {index_name}...")
-    pc.create_index(
-        name=index_name,
-        dimension=1024,  # Dimension of the embeddings
-        metric="cosine",  # Similarity metric
-        spec=ServerlessSpec(
-            cloud="aws",
-            region="us-east-1"
-        )
+
+def plan_ingestion(sources, manifest):
+    """
+    Compare the source files (absolute path -> manifest key) with the manifest.
+    Returns (changed, unchanged, removed): changed maps absolute path -> sha256 for new or
+    modified files (or files chunked under an older CHUNK_SCHEMA_VERSION), unchanged/removed
+    are manifest keys.
+    """
+    changed, unchanged = {}, []
+    on_disk = set()
+    for path, relative_path in sources.items():
+        on_disk.add(relative_path)
+        sha256 = file_sha256(path)
+        record = manifest.files.get(relative_path, {})
+        if record.get("sha256") == sha256 and record.get("chunk_schema", 1) == CHUNK_SCHEMA_VERSION:
+            unchanged.append(relative_path)
+        else:
+            changed[path] = sha256
+    removed = [relative_path for relative_path in manifest.files if relative_path not in on_disk]
+    return changed, unchanged, removed
+
+
+# Shared by all worker threads: requests are only spaced out after the service answers 429
+embedding_pacer = AdaptivePacer("embedding", max_delay=RETRY_MAX_DELAY)
+upsert_pacer = AdaptivePacer("upsert", max_delay=RETRY_MAX_DELAY)
+
+
+def create_ingestion_embeddings(provider=EMBEDDING_PROVIDER, store_dir=EMBEDDING_STORE_DIR, embeddings=None):
+    """
+    Embedding client for ingestion, backed by the on-disk embedding store: chunks whose text
+    was embedded in an earlier run (e.g. before a splitter change) skip the embedding API.
+    """
+    embeddings = embeddings or create_embeddings(embedding_model, provider)
+    if not store_dir:
+        return embeddings
+    disk_store = DiskEmbeddingStore(os.path.join(store_dir, provider, embedding_model))
+    print(f"🧠 Embedding store: {len(disk_store)} chunk embeddings in {disk_store.directory}")
+    return CachedEmbeddings(embeddings, model=embedding_model, memory_cache=TTLCache(maxsize=batch_size * 4, ttl=None),
+                            disk_store=disk_store)
+
+
+def with_retries(operation, description, pacer=None):
+    """
+    Run `operation`, retrying with exponential backoff; re-raises once attempts are exhausted.
+    With a pacer, 429 responses slow down every caller sharing it instead of this one alone.
+    """
+    for attempt in range(1, MAX_BATCH_ATTEMPTS + 1):
+        if pacer is not None:
+            pacer.wait()
+        try:
+            result = operation()
+        except Exception as e:
+            if attempt == MAX_BATCH_ATTEMPTS:
+                print(f"❌ {description} failed after {attempt} attempts: {e}")
+                raise
+            if pacer is not None and is_rate_limited(e):
+                delay = pacer.throttle(retry_after_seconds(e))
+                print(f"🚦 {description} was rate limited (attempt {attempt}/{MAX_BATCH_ATTEMPTS}), "
+                      f"pacing {pacer.name} requests {delay:.1f}s apart")
+                continue
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            print(f"⚠️ {description} failed (attempt {attempt}/{MAX_BATCH_ATTEMPTS}): {e}")
+            print(f"   Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+        else:
+            if pacer is not None:
+                pacer.success()
+            return result
+
+
+def ensure_pinecone_index(manifest, embeddings, index_name=index_name):
+    """
+    Create the Pinecone index if it is missing; returns the vector store to write to and
+    whether the index was just created.
+    """
+    from pinecone.grpc import PineconeGRPC as Pinecone
+    from langchain_pinecone import PineconeVectorStore
+
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+
+    # Creates the index if needed and polls until Pinecone reports it ready
+    created = ensure_index(pc, index_name, dimension=embedding_dimension, metric="cosine")
+    if created:
+        # A fresh index holds none of the chunks the manifest remembers
+        manifest.reset()
+    else:
+        print(f"Index {index_name} already exists, proceeding with upload...")
+
+    docsearch = PineconeVectorStore(index_name=index_name, embedding=embeddings, pinecone_api_key=PINECONE_API_KEY)
+    return docsearch, created
+
+
+def upsert_payload_bytes(chunk):
+    """Rough size of one chunk's upsert record: JSON-encoded vector, metadata and text."""
+    return embedding_dimension * 20 + 2 * len(chunk.page_content.encode("utf-8")) + len(json.dumps(chunk.metadata)) + 64
+
+
+def embed_batch(batch, embeddings, timer=None):
+    """Pipeline worker: (chunks, vectors) for one batch of chunks."""
+    started = time.perf_counter()
+    vectors = with_retries(
+        lambda: embeddings.embed_documents([doc.page_content for doc in batch]),
+        f"Embedding {len(batch)} chunks", pacer=embedding_pacer
     )
-    print("Waiting for index to be ready...")
-    time.sleep(60)
-else:
-    print(f"Index {index_name} already exists, proceeding with upload...")
-
-# Upload text chunks to the index in batches
-print("Starting batch upload of text chunks...")
-batch_size = 100  # Upload 100 chunks at a time
-total_chunks = len(text_chunks)
-uploaded_count = 0
-
-for i in range(0, total_chunks, batch_size):
-    batch = text_chunks[i:i + batch_size]
-    current_batch_size = len(batch)
-    
-    print(f"Uploading batch {i//batch_size + 1}: chunks {i+1}-{i+current_batch_size} of {total_chunks}")
-    
-    try:
-        if i == 0:
-            # Create the vector store with the first batch
-            docsearch = PineconeVectorStore.from_documents(
-                documents=batch,
-                index_name=index_name,
-                embedding=embeddings,
+    if timer is not None:
+        timer.add("embed", time.perf_counter() - started)
+    return batch, vectors
+
+
+def embed_batches(batches, embeddings, concurrency=EMBED_CONCURRENCY, timer=None):
+    """Pipeline stage: embed batches with up to `concurrency` requests in flight, in order."""
+    return parallel_map(lambda batch: embed_batch(batch, embeddings, timer), batches, concurrency, name="embed")
+
+
+def chunk_metadata(chunk):
+    """What the manifest remembers about a written chunk."""
+    return {"source": chunk.metadata.get("source"), "page": chunk.metadata.get("page")}
+
+
+def upload_to_pinecone(embedded_batches, docsearch, manifest, concurrency=UPSERT_CONCURRENCY, timer=None,
+                       index_name=index_name, sparse_writer=None):
+    """
+    Upsert pre-embedded batches into the manifest's namespace of the Pinecone index as they
+    arrive, with up to `concurrency` requests in flight; returns the number uploaded.
+    Uploaded chunks are also handed to `sparse_writer` for the namespace's BM25 index.
+    """
+    timer = timer or StageTimer()
+    print("Starting batch upload of text chunks...")
+
+    def upsert(item):
+        batch, vectors = item
+        # Same record layout PineconeVectorStore.add_documents writes: chunk text stored under "text"
+        records = [
+            (chunk.id, list(vector), {**chunk.metadata, PINECONE_TEXT_KEY: chunk.page_content})
+            for chunk, vector in zip(batch, vectors)
+        ]
+        with timer.measure("write"):
+            with_retries(lambda: docsearch.index.upsert(vectors=records, namespace=manifest.namespace),
+                         f"Upserting {len(batch)} chunks", pacer=upsert_pacer)
+        return batch
+
+    uploaded_count = 0
+    for batch_number, batch in enumerate(parallel_map(upsert, embedded_batches, concurrency, name="upsert"), start=1):
+        # The manifest is only touched from this thread
+        if sparse_writer is not None:
+            sparse_writer.add(batch)
+        manifest.mark_done([chunk.id for chunk in batch], [chunk_metadata(c) for c in batch])
+        uploaded_count += len(batch)
+        print(f"Successfully uploaded batch {batch_number}. Total uploaded: {uploaded_count}")
+
+    if embedding_pacer.throttled or upsert_pacer.throttled:
+        print(f"🚦 Rate limited {embedding_pacer.throttled} embedding and {upsert_pacer.throttled} upsert request(s)")
+    print(f"Upload completed! Uploaded {uploaded_count} new chunks to Pinecone index '{index_name}'")
+    return uploaded_count
+
+
+def stale_chunk_ids(manifest, chunk_ids_by_file, removed):
+    """IDs the manifest lists for changed or removed files that the new chunks no longer contain."""
+    current_ids = {chunk_id for ids in chunk_ids_by_file.values() for chunk_id in ids}
+    return {
+        old_id
+        for relative_path in list(chunk_ids_by_file) + removed
+        for old_id in manifest.files.get(relative_path, {}).get("chunk_ids", [])
+        if old_id not in current_ids
+    }
+
+
+def open_build_manifest(manifest_dir, index, base_namespace):
+    """
+    Manifest of the Pinecone namespace the next index version is built in. An interrupted
+    build on top of the same live namespace is resumed; otherwise a new version starts.
+    Returns (manifest, abandoned namespace or None).
+    """
+    path = os.path.join(manifest_dir, f"{index}.build.json")
+    pending = IngestionManifest.peek(path)
+    abandoned = None
+    if pending and pending.get("version") and pending.get("base_namespace") == base_namespace:
+        version = pending["version"]
+        print(f"♻️ Resuming build of index version {version}")
+    else:
+        if pending and pending.get("namespace"):
+            abandoned = pending["namespace"]
+        version = new_version_id()
+    build = IngestionManifest(path, index, namespace=f"v{version}")
+    build.data.update({"version": version, "base_namespace": base_namespace})
+    build.save()
+    return build, abandoned
+
+
+def copy_pinecone_chunks(docsearch, chunk_ids, source_namespace, build, metadata, concurrency=UPSERT_CONCURRENCY,
+                         timer=None, sparse_writer=None):
+    """
+    Copy the vectors of unchanged chunks from the live namespace into the build namespace
+    (fetch + upsert, no re-embedding); returns the number copied.
+    Tradeoff of blue/green on Pinecone: a query reads one namespace, so every version holds the
+    whole corpus and each update costs fetch/upsert traffic (and write units) proportional to the
+    corpus, not to the change. Embedding calls - the expensive part - stay proportional to the change.
+    """
+    timer = timer or StageTimer()
+    pending = sorted(chunk_id for chunk_id in chunk_ids if not build.is_done(chunk_id))
+
+    def copy(batch_ids):
+        with timer.measure("carry_over"):
+            fetched = with_retries(lambda: docsearch.index.fetch(ids=batch_ids, namespace=source_namespace),
+                                   f"Fetching {len(batch_ids)} unchanged chunks", pacer=upsert_pacer)
+            records = [(vector_id, list(vector.values), dict(vector.metadata or {}))
+                       for vector_id, vector in fetched.vectors.items()]
+            if records:
+                with_retries(lambda: docsearch.index.upsert(vectors=records, namespace=build.namespace),
+                             f"Copying {len(records)} unchanged chunks", pacer=upsert_pacer)
+        return records
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    copied = 0
+    for records in parallel_map(copy, batches, concurrency, name="copy"):
+        if sparse_writer is not None:
+            sparse_writer.add(
+                Document(id=vector_id, page_content=meta.pop(PINECONE_TEXT_KEY, ""), metadata=meta)
+                for vector_id, _, meta in records
             )
+        ids = [vector_id for vector_id, _, _ in records]
+        build.mark_done(ids, [metadata.get(chunk_id, {}) for chunk_id in ids])
+        copied += len(ids)
+    if copied < len(pending):
+        print(f"⚠️ {len(pending) - copied} unchanged chunks were missing from namespace '{source_namespace}'")
+    if copied:
+        print(f"♻️ Copied {copied} unchanged chunks into namespace '{build.namespace}'")
+    return copied
+
+
+def live_index_entry(index=index_name, options=None, pinecone_index=None):
+    """
+    Entry currently published for `index`. For Pinecone the alias stored in the index wins
+    over the local registry file, so a build on any host starts from the version being served.
+    """
+    options = options or IngestOptions()
+
+    def read_alias(alias):
+        handle = pinecone_index
+        if handle is None:
+            from pinecone import Pinecone
+            handle = Pinecone(api_key=PINECONE_API_KEY).Index(alias)
+        return read_pinecone_alias(handle, alias)
+
+    remote = read_alias if options.backend == "pinecone" else None
+    return IndexRegistry(options.registry_path, refresh_seconds=0, remote=remote).resolve(index)
+
+
+def drop_retired_versions(index=index_name, options=None, pinecone_index=None):
+    """
+    Drop index versions that were replaced more than options.grace_seconds ago: their local
+    index directory or Pinecone namespace (and its BM25 index) is deleted. Returns the dropped
+    registry entries.
+    """
+    options = options or IngestOptions()
+    live = live_index_entry(index, options, pinecone_index)
+    live_key = (live.get("namespace", ""), live.get("version"))
+    dropped = []
+    for entry in retired_index_versions(index, options.registry_path):
+        if entry.get("backend", options.backend) != options.backend:
+            continue
+        retired_for = (datetime.now() - datetime.fromisoformat(entry["retired_at"])).total_seconds()
+        if retired_for < options.grace_seconds:
+            continue
+        namespace = entry.get("namespace", "")
+        if (namespace, entry.get("version")) != live_key:
+            if options.backend == "local":
+                path = os.path.join(options.local_index_dir, entry.get("index_name", index), namespace or "default",
+                                    entry["version"])
+                shutil.rmtree(path, ignore_errors=True)
+            elif namespace != live_key[0]:  # Never wipe the namespace being served
+                if pinecone_index is None:
+                    from pinecone import Pinecone
+                    pinecone_index = Pinecone(api_key=PINECONE_API_KEY).Index(entry.get("index_name", index))
+                with_retries(lambda: pinecone_index.delete(delete_all=True, namespace=namespace),
+                             f"Dropping namespace '{namespace}'", pacer=upsert_pacer)
+                shutil.rmtree(os.path.join(options.sparse_index_dir, entry.get("index_name", index),
+                                           namespace or "default"), ignore_errors=True)
+        forget_retired_version(index, entry, options.registry_path)
+        dropped.append(entry)
+        print(f"🗑️ Dropped index version {entry['version']} (retired {retired_for / 60:.0f} min ago)")
+    return dropped
+
+
+def latest_local_index(index_name=index_name, root=LOCAL_INDEX_DIR):
+    """The most recent local index version, or None when nothing was built yet."""
+    try:
+        return LocalVectorIndex(resolve_local_index_path(root, index_name))
+    except FileNotFoundError:
+        return None
+
+
+def write_local_batches(embedded_batches, writer, timer=None):
+    """Append pre-embedded batches to a LocalIndexWriter as they arrive; returns the chunks written."""
+    timer = timer or StageTimer()
+    written = []
+    for batch, vectors in embedded_batches:
+        with timer.measure("write"):
+            writer.add(batch, vectors)
+        written.extend(batch)
+        print(f"Embedded and wrote {len(written)} new chunks")
+    return written
+
+
+def carry_over_local_chunks(writer, keep_ids, previous):
+    """Copy chunks listed in keep_ids from the previous local index version into the new one."""
+    previous = previous if keep_ids else None
+    if previous is None:
+        return 0
+    rows = [row for row, doc in enumerate(previous.documents) if doc.id in keep_ids]
+    for i in range(0, len(rows), batch_size):
+        batch_rows = rows[i:i + batch_size]
+        writer.add([previous.documents[row] for row in batch_rows], np.asarray(previous.vectors[batch_rows]))
+    print(f"♻️ Reusing {len(rows)} unchanged chunks from {previous.path}")
+    return len(rows)
+
+
+def stream_chunks(sources, file_hashes, chunk_ids_by_file, deduplicator=None, workers=None, timer=None):
+    """
+    Pipeline stage: pages of `sources` (absolute path -> manifest key) are split as soon as
+    they are parsed, chunks get their chapter/section/page/content metadata, duplicates are
+    dropped, and chunk IDs are assigned and recorded per manifest key in chunk_ids_by_file
+    (complete once the stream is exhausted).
+    """
+    timer = timer or StageTimer()
+    splitter = make_text_splitter()
+    pages = threaded(timer.timed(iter_pdf_pages(list(sources), workers), "parse"), PAGE_QUEUE_SIZE, name="pdf")
+    current_source, tracker = None, None
+    for page in pages:
+        source = page.metadata["source"]
+        if source != current_source:
+            # Pages arrive in file and page order, so headings carry over from the previous page
+            current_source, tracker = source, SectionTracker()
+        with timer.measure("split"):
+            chunks = splitter.split_documents([page])
+            annotate_chunks(chunks, tracker.page_headings(page.page_content), sources[source])
+        if deduplicator is not None:
+            with timer.measure("dedup"):
+                chunks = [chunk for chunk in chunks if not deduplicator.is_duplicate(chunk.page_content)]
+        chunks = assign_chunk_ids(chunks, file_hashes)
+        chunk_ids_by_file[sources[source]].extend(chunk.id for chunk in chunks)
+        yield from chunks
+
+
+def ingest(paths: Optional[Iterable[str]] = None, index: str = index_name,
+           options: Optional[IngestOptions] = None) -> Dict:
+    """
+    Bring `index` in line with the PDFs under `paths` (files or directories, default Data/).
+    `paths` is the complete source set: files the manifest knows that are no longer among them
+    are removed from the index. Only new or modified files are parsed, split and embedded.
+    Returns a report with chunk counts, per-stage busy time and the published version.
+    """
+    options = options or IngestOptions()
+    sources = collect_sources(paths or [DEFAULT_DATA_DIR])
+    report = {"index": index, "backend": options.backend, "dry_run": options.dry_run, "version": None}
+
+    # The manifest describes the live version; updates are built as a new version next to it
+    live_namespace = ""
+    if options.backend == "pinecone":
+        live_namespace = live_index_entry(index, options).get("namespace", "")
+    manifest_name = f"{index}.local.json" if options.backend == "local" else f"{index}.json"
+    manifest = IngestionManifest(os.path.join(options.manifest_dir, manifest_name), index, live_namespace)
+    embeddings = None
+    build = None
+    sparse_writer = None
+    if not options.dry_run:
+        # Initialize embeddings model (EMBEDDING_PROVIDER=hashing selects the offline stand-in)
+        embeddings = create_ingestion_embeddings(options.embedding_provider, options.embedding_store_dir,
+                                                 options.embeddings)
+        print("🔧 Initialized embeddings model")
+        if options.backend == "local":
+            if latest_local_index(index, options.local_index_dir) is None:
+                manifest.reset()
+        elif options.backend == "pinecone":
+            docsearch, created = ensure_pinecone_index(manifest, embeddings, index)
+            build, abandoned = open_build_manifest(options.manifest_dir, index, live_namespace)
+            sparse_path = os.path.join(options.sparse_index_dir, index, build.namespace)
+            if created:
+                build.reset()
+                shutil.rmtree(f"{sparse_path}.building", ignore_errors=True)
+            elif abandoned and abandoned != live_namespace:
+                print(f"🗑️ Dropping namespace '{abandoned}' of an abandoned build")
+                with_retries(lambda: docsearch.index.delete(delete_all=True, namespace=abandoned),
+                             f"Dropping namespace '{abandoned}'", pacer=upsert_pacer)
+                shutil.rmtree(os.path.join(options.sparse_index_dir, index, f"{abandoned}.building"), ignore_errors=True)
+            # BM25 index for hybrid retrieval, built alongside the namespace
+            sparse_writer = SparseIndexWriter(sparse_path)
         else:
-            # Add subsequent batches to the existing vector store
-            docsearch.add_documents(documents=batch)
-        
-        uploaded_count += current_batch_size
-        print(f"Successfully uploaded batch. Total uploaded: {uploaded_count}/{total_chunks}")
-        
-        # Small delay between batches to avoid rate limiting
-        time.sleep(2)
-        
-    except Exception as e:
-        print(f"Error uploading batch {i//batch_size + 1}: {e}")
-        print(f"Retrying batch after 10 seconds...")
-        time.sleep(10)
-        
-        try:
-            if i == 0:
-                docsearch = PineconeVectorStore.from_documents(
-                    documents=batch,
-                    index_name=index_name,
-                    embedding=embeddings,
-                )
+            raise ValueError(f"Unknown backend: {options.backend}")
+
+    print(f"✂️ Chunking by {CHUNK_MODE}")
+    # Only new or modified files are parsed, split and embedded
+    changed, unchanged, removed = plan_ingestion(sources, manifest)
+    print(f"🔍 {len(changed)} new/changed, {len(unchanged)} unchanged, {len(removed)} removed files")
+    report["files"] = {"changed": len(changed), "unchanged": len(unchanged), "removed": len(removed)}
+    if not changed and not removed:
+        print("✅ Knowledge base is already up to date")
+        if build is not None:
+            build.delete()
+            sparse_writer.abort()
+        return report
+
+    # Streaming pipeline: parse pages -> split -> deduplicate -> embed batches -> write batches.
+    # Every stage runs concurrently behind a bounded queue, so writing starts with the first
+    # parsed pages and memory stays flat however large the corpus is.
+    started = time.perf_counter()
+    timer = StageTimer()
+    changed_sources = {path: sources[path] for path in changed}
+    chunk_ids_by_file = {relative_path: [] for relative_path in changed_sources.values()}
+    chunk_sizes = ChunkSizeReport()
+    # Repeated headers/footers/boilerplate are dropped before they are embedded
+    deduplicator = ChunkDeduplicator() if options.dedup else None
+
+    def new_chunks():
+        for chunk in stream_chunks(changed_sources, changed, chunk_ids_by_file, deduplicator, options.workers, timer):
+            chunk_sizes.add(chunk.page_content)
+            # Chunks whose ID is unchanged inside a modified file need no new embedding
+            if not manifest.is_done(chunk.id) and not (build is not None and build.is_done(chunk.id)):
+                yield chunk
+
+    # Blue/green: the update is written as a new version (local index directory or Pinecone
+    # namespace) while servers keep reading the live one, then published in one alias switch
+    version = build.data["version"] if build is not None else new_version_id()
+    target = build or manifest
+    if options.dry_run:
+        pending = sum(1 for _ in new_chunks())
+        uploaded_count = 0
+        stale_ids = stale_chunk_ids(manifest, chunk_ids_by_file, removed)
+        print(f"🧪 Dry run: {pending} chunks would be embedded and written, {len(stale_ids)} stale chunks removed")
+        report["pending"] = pending
+    else:
+        # Batches hold at most batch_size chunks and stay under the upsert request size limit
+        batches = batched_by_size(new_chunks(), options.batch_size, MAX_BATCH_BYTES, upsert_payload_bytes)
+        embedded_batches = threaded(embed_batches(batches, embeddings, options.embed_concurrency, timer),
+                                    EMBED_QUEUE_SIZE, name="embed")
+
+        if options.backend == "local":
+            path = os.path.join(options.local_index_dir, index, "default", version)
+            previous = latest_local_index(index, options.local_index_dir)
+            writer = LocalIndexWriter(path, embedding_model=embedding_model, nlist=LOCAL_INDEX_NLIST)
+            try:
+                written = write_local_batches(embedded_batches, writer, timer)
+                stale_ids = stale_chunk_ids(manifest, chunk_ids_by_file, removed)
+                with timer.measure("write"):
+                    carry_over_local_chunks(writer, set(manifest.chunks) - stale_ids, previous)
+            except BaseException:
+                writer.abort()
+                raise
+            uploaded_count = len(written)
+            if uploaded_count or stale_ids:
+                with timer.measure("build_index"):
+                    writer.close()
+                print(f"Local index completed! Wrote {writer.count} chunks ({uploaded_count} newly embedded) to '{path}'")
             else:
-                docsearch.add_documents(documents=batch)
-            
-            uploaded_count += current_batch_size
-            print(f"Retry successful. Total uploaded: {uploaded_count}/{total_chunks}")
-        except Exception as retry_error:
-            print(f"Retry failed for batch {i//batch_size + 1}: {retry_error}")
-            continue
+                writer.abort()
+            manifest.mark_done([chunk.id for chunk in written], [chunk_metadata(c) for c in written])
+            manifest.forget_chunks(stale_ids)
+        else:
+            uploaded_count = upload_to_pinecone(embedded_batches, docsearch, build, options.upsert_concurrency, timer, index,
+                                                sparse_writer)
+            stale_ids = stale_chunk_ids(manifest, chunk_ids_by_file, removed)
+            # A resumed build may hold chunks uploaded by the interrupted run
+            if uploaded_count or stale_ids or build.chunks:
+                # Unchanged chunks are copied from the live namespace, stale ones are simply left behind
+                report["carried_over"] = copy_pinecone_chunks(
+                    docsearch, set(manifest.chunks) - stale_ids, live_namespace, build, manifest.chunks,
+                    options.upsert_concurrency, timer, sparse_writer
+                )
+            build.data["files"] = dict(manifest.files)
+    elapsed = time.perf_counter() - started
+    print(f"📝 Processed {len(chunk_sizes.tokens)} text chunks in {elapsed:.1f}s (peak RSS {peak_rss_mb():.0f} MB)")
+    if deduplicator is not None:
+        stats = deduplicator.stats()
+        print(f"🧹 Dropped {stats['exact_dropped']} exact and {stats['near_dropped']} near-duplicate chunks "
+              f"({stats['dropped_ratio']:.1%} of {stats['seen']})")
+        report["dedup"] = stats
+    print(chunk_sizes.format(RAG_TOP_K, RAG_RESULT_HEADER))
+    if isinstance(embeddings, CachedEmbeddings):
+        stats = embeddings.stats()
+        print(f"🧠 {stats['disk_hits']} chunk embeddings reused from the store, {stats['remote_texts']} embedded remotely")
+        report["embedding_store"] = {"reused": stats["disk_hits"], "embedded": stats["remote_texts"]}
+    report.update({
+        "chunks": len(chunk_sizes.tokens),
+        "chunk_sizes": chunk_sizes.summary(),
+        "written": uploaded_count,
+        "stale_removed": len(stale_ids),
+        "elapsed_seconds": elapsed,
+        "stage_seconds": timer.totals(),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    if options.dry_run:
+        return report
+
+    for path, sha256 in changed.items():
+        relative_path = sources[path]
+        target.set_file(relative_path, sha256, chunk_ids_by_file[relative_path], CHUNK_SCHEMA_VERSION)
+    for relative_path in removed:
+        target.remove_file(relative_path)
+    print(f"📊 {uploaded_count} chunks embedded and written, {len(stale_ids)} stale chunks removed")
+
+    if uploaded_count or stale_ids or (build is not None and build.chunks):
+        if sparse_writer is not None:
+            with timer.measure("build_index"):
+                sparse_writer.close()
+        # Atomic switch: servers move to the new version at their next registry refresh and
+        # drop their cached retrieval results
+        entry = publish_index_version(index, namespace=target.namespace, version=version, path=options.registry_path,
+                                      backend=options.backend)
+        if build is not None:
+            # Servers read the alias from the index itself; the registry file only serves this host
+            with_retries(lambda: write_pinecone_alias(docsearch.index, index, entry),
+                         f"Publishing version {entry['version']}", pacer=upsert_pacer)
+        report["version"] = entry["version"]
+        print(f"📌 Published index version {entry['version']}")
+        if build is not None:
+            for key in ("version", "base_namespace"):
+                build.data.pop(key, None)
+            build.promote_to(manifest.path)
+    elif build is not None:
+        # Nothing to switch to: keep the live version and fold the file records into its manifest
+        manifest.data["files"] = build.data["files"]
+        manifest.save()
+        build.delete()
+        sparse_writer.abort()
+    report["dropped_versions"] = [entry["version"] for entry in drop_retired_versions(
+        index, options, docsearch.index if build is not None else None)]
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest PDFs into the MediBlaze knowledge base")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (default: Data/)")
+    parser.add_argument("--index", default=index_name, help="Index name / registry alias")
+    parser.add_argument("--backend", choices=["pinecone", "local"], default=VECTOR_BACKEND)
+    parser.add_argument("--workers", type=int, default=None, help=f"PDF extraction processes (default: {PDF_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=batch_size, help="Max chunks per embedding/upsert request")
+    parser.add_argument("--embed-concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--upsert-concurrency", type=int, default=UPSERT_CONCURRENCY)
+    parser.add_argument("--embeddings", choices=["pinecone", "hashing"], default=EMBEDDING_PROVIDER,
+                        help="Embedding provider (hashing = offline stand-in)")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep duplicate chunks")
+    parser.add_argument("--dry-run", action="store_true", help="Parse, split and deduplicate only; write nothing")
+    parser.add_argument("--drop-retired", action="store_true",
+                        help="Only drop index versions replaced more than INDEX_VERSION_GRACE_SECONDS ago")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = IngestOptions(
+        backend=args.backend,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        embed_concurrency=args.embed_concurrency,
+        upsert_concurrency=args.upsert_concurrency,
+        dry_run=args.dry_run,
+        dedup=not args.no_dedup,
+        embedding_provider=args.embeddings,
+    )
+    if args.drop_retired:
+        drop_retired_versions(args.index, options)
+        return
+    ingest(args.paths, index=args.index, options=options)
+
 
-print(f"Upload completed! Successfully uploaded {uploaded_count}/{total_chunks} chunks to Pinecone index '{index_name}'")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+🚦 Rate-limit-aware pacing for ingestion calls to the embedding and Pinecone APIs.
+Requests go out unthrottled until the service answers 429; from then on calls are spaced
+by a delay that doubles on every 429 (or follows Retry-After) and decays on success.
+"""
+import time
+import threading
+from typing import Optional
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for HTTP 429 / gRPC RESOURCE_EXHAUSTED errors from Pinecone or the embedding API."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if status == 429:
+        return True
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """The Retry-After header of a 429 response, when the service sent one."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        value = {str(k).lower(): v for k, v in dict(headers).items()}.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptivePacer:
+    """Spaces out calls shared by several worker threads according to observed 429s."""
+
+    def __init__(self, name: str, initial_delay: float = 0.5, max_delay: float = 60.0, decay: float = 0.8):
+        self.name = name
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.decay = decay
+        self.delay = 0.0
+        self.throttled = 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until this caller's slot; free while no 429 has been seen recently."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+    def throttle(self, retry_after: Optional[float] = None) -> float:
+        """Record a 429: slow down and hold every caller back for the new delay."""
+        with self._lock:
+            self.throttled += 1
+            self.delay = min(self.max_delay, max(self.delay * 2, self.initial_delay, retry_after or 0.0))
+            self._next_slot = max(self._next_slot, time.monotonic() + self.delay)
+            return self.delay
+
+    def success(self) -> None:
+        """Record a successful call: speed back up gradually."""
+        with self._lock:
+            self.delay = self.delay * self.decay if self.delay * self.decay >= 0.05 else 0.0
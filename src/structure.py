@@ -0,0 +1,101 @@
+"""
+🏷️ Structured chunk metadata for src/rag_upload.py.
+Headings are recognised in the page text as short, title-like lines that start a new
+paragraph. A heading directly followed by another heading is an entry title (chapter) with
+its first section ("Alpha-fetoprotein test" / "Definition"), unless it is itself a standard
+section name; a lone heading opens a new section of the current chapter. Headings carry
+across pages, so every chunk knows the chapter and section it belongs to.
+"""
+import re
+from typing import List, Tuple
+
+from agent.utils.metadata_filter import normalize_heading
+
+HEADING_MAX_WORDS = 6
+HEADING_MAX_CHARS = 60
+# Sections holding bibliographies / addresses rather than medical content
+REFERENCE_SECTIONS = {"resources", "bibliography", "references", "further reading"}
+# Standard section names of medical reference entries - never taken for an entry title
+SECTION_NAMES = REFERENCE_SECTIONS | {
+    "definition", "description", "purpose", "causes", "symptoms", "causes and symptoms", "diagnosis",
+    "treatment", "alternative treatment", "prognosis", "prevention", "precautions", "preparation",
+    "aftercare", "risks", "normal results", "abnormal results", "side effects", "interactions",
+    "recommended dosage", "special conditions", "key terms",
+}
+
+_SENTENCE_END = ('.', '!', '?', ':', ')', '”', '"')
+_BULLET = re.compile(r"^\s*(?:[•▪◦·*-]|\d+[.)])\s+")
+
+
+def is_heading(line: str, previous_line: str) -> bool:
+    line = line.strip()
+    words = line.split()
+    if not words or len(words) > HEADING_MAX_WORDS or len(line) > HEADING_MAX_CHARS:
+        return False
+    if not line[0].isupper() or line.isupper() or _BULLET.match(line):
+        return False  # ALL-CAPS lines are sub-labels (BOOKS, KEY TERMS), not headings
+    if line.endswith(('.', ',', ';', ':', '-', '–', '—', ')', '”', '"')) or any(c.isdigit() for c in line):
+        return False
+    if " see " in line:
+        return False  # Cross-reference entry ("Air embolism see Gas embolism")
+    # A heading starts a paragraph: the line before it ends a sentence or is a heading itself
+    return not previous_line or previous_line.rstrip().endswith(_SENTENCE_END) or is_heading(previous_line, "")
+
+
+class SectionTracker:
+    """Current chapter / section while the pages of one file are read in order."""
+
+    def __init__(self):
+        self.chapter = ""
+        self.section = ""
+
+    def page_headings(self, text: str) -> List[Tuple[int, str, str]]:
+        """(offset, chapter, section) at the start of the page and at every heading on it."""
+        events = [(0, self.chapter, self.section)]
+        previous_line, previous_heading = "", None
+        offset = 0
+        for line in text.split("\n"):
+            if is_heading(line, previous_line):
+                heading = normalize_heading(line)
+                if previous_heading is not None and previous_heading[1] not in SECTION_NAMES:
+                    # Title line followed by a section heading: a new chapter starts
+                    self.chapter, self.section = previous_heading[1], heading
+                    events.append((previous_heading[0], self.chapter, self.section))
+                else:
+                    self.section = heading
+                    events.append((offset, self.chapter, self.section))
+                previous_heading = (offset, heading)
+            else:
+                previous_heading = None
+            previous_line = line
+            offset += len(line) + 1
+        return events
+
+
+def content_type(text: str, section: str) -> str:
+    """"references", "list" or "text"."""
+    if section in REFERENCE_SECTIONS or text.count("http") >= 2:
+        return "references"
+    lines = [line for line in text.split("\n") if line.strip()]
+    if lines and sum(bool(_BULLET.match(line)) for line in lines) * 2 >= len(lines):
+        return "list"
+    return "text"
+
+
+def annotate_chunks(chunks, headings: List[Tuple[int, str, str]], source_file: str) -> None:
+    """Attach source file, chapter, section, page range and content type to chunks of one page."""
+    for chunk in chunks:
+        start = chunk.metadata.get("start_index", 0)
+        # Latest heading at or before the chunk start (later events win at equal offsets)
+        _, chapter, section = [event for event in headings if event[0] <= start][-1]
+        page = chunk.metadata.get("page", 0)
+        chunk.metadata.update({
+            "source_file": source_file,
+            "chapter": chapter,
+            "section": section,
+            # Chunks never span pages with the current splitters; the range keeps filters stable if they do
+            "page_start": page,
+            "page_end": page,
+            "content_type": content_type(chunk.page_content, section),
+        })
+
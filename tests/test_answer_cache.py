@@ -0,0 +1,40 @@
+from agent.utils.answer_cache import SemanticAnswerCache
+from agent.utils.local_index import HashingEmbeddings
+
+EMBEDDINGS = HashingEmbeddings()
+
+
+def make_cache(version=lambda: "v1", threshold=0.5):
+    return SemanticAnswerCache(lambda: EMBEDDINGS, version, threshold=threshold, ttl=0)
+
+
+def test_rephrased_question_hits():
+    cache = make_cache()
+    cache.set("What causes migraines?", "ANSWER-MIGRAINE", ["rag_tool"])
+    assert cache.get("what causes a migraine")["answer"] == "ANSWER-MIGRAINE"
+
+
+def test_different_population_or_number_misses():
+    cache = make_cache(threshold=0.0)
+    cache.set("paracetamol dose for children", "CHILDREN", [])
+    cache.set("fever for 3 days", "THREE", [])
+    assert cache.get("paracetamol dose for adults") is None
+    assert cache.get("fever for 10 days") is None
+
+
+def test_lru_reordering_keeps_rows_aligned():
+    cache = make_cache()
+    cache.set("symptoms of diabetes", "ANSWER-DIABETES", [])
+    cache.set("symptoms of malaria", "ANSWER-MALARIA", [])
+    assert cache.get("diabetes symptoms")["answer"] == "ANSWER-DIABETES"
+    assert cache.get("symptoms of diabetes")["answer"] == "ANSWER-DIABETES"
+    assert cache.get("malaria symptoms")["answer"] == "ANSWER-MALARIA"
+
+
+def test_version_change_and_uncacheable_tools():
+    version = ["v1"]
+    cache = make_cache(version=lambda: version[0])
+    assert not cache.set("I have a fever and a rash", "PREDICTION", ["disease_prediction"])
+    cache.set("What is anemia?", "ANSWER-ANEMIA", [])
+    version[0] = "v2"
+    assert cache.get("What is anemia?") is None
@@ -0,0 +1,21 @@
+from langchain_core.documents import Document
+
+from agent.utils.compression import compress_documents
+
+MIGRAINE_DOCS = [
+    Document(page_content="Migraine headaches are thought to result from changes in blood vessels. "
+                          "Triggers include stress, certain foods and hormonal changes."),
+    Document(page_content="A migraine is often preceded by an aura. Genetic factors play a role in who gets migraine."),
+    Document(page_content="Tension headaches have different causes, such as muscle strain. They are usually mild."),
+]
+
+
+def test_documents_without_literal_matches_are_kept():
+    extracts = compress_documents("What causes migraines?", MIGRAINE_DOCS, token_budget=600)
+    assert len(extracts) == 3
+    assert extracts[0].startswith("Migraine headaches")
+
+
+def test_budget_is_respected():
+    extracts = compress_documents("What causes migraines?", MIGRAINE_DOCS, token_budget=20)
+    assert extracts == ["Migraine headaches are thought to result from changes in blood vessels."]
@@ -0,0 +1,17 @@
+from agent.utils.cache import TTLCache
+from agent.utils.embedding_cache import CachedEmbeddings, DiskEmbeddingStore
+from agent.utils.local_index import HashingEmbeddings
+
+
+def test_configured_memory_cache_is_used():
+    memory_cache = TTLCache(maxsize=4096, ttl=86400)
+    embeddings = CachedEmbeddings(HashingEmbeddings(), "hashing", memory_cache=memory_cache)
+    assert embeddings.memory_cache is memory_cache
+    embeddings.embed_query("What causes migraines?")
+    assert len(memory_cache) == 1
+
+
+def test_disk_store_round_trip(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path))
+    store.put_many({"a": [1.0, 0.0], "b": [0.0, 1.0]})
+    assert DiskEmbeddingStore(str(tmp_path)).get_many(["a", "b"]) == {"a": [1.0, 0.0], "b": [0.0, 1.0]}